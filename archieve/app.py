@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from src.agents import agent_app
+from src.agents import get_agent_app
 from langchain_core.messages import BaseMessage, HumanMessage
 
 # Page config
@@ -246,7 +246,7 @@ if user_input:
     # Example agent response with dataframe
     with st.spinner("Agent is processing..."):
         # Simulated agent response
-        agent_response = agent_app.invoke({"messages": [HumanMessage(content=user_input)]})
+        agent_response = get_agent_app().invoke({"messages": [HumanMessage(content=user_input)]})
 
         st.session_state.messages.append({
             "role": "assistant",
@@ -0,0 +1,82 @@
+"""
+Throughput of the sync vs. async agent path with fake LLM/embedding latency.
+
+    python -m benchmarks.bench_async --questions 64 --threads 8 --llm-latency 0.3
+
+The sync path runs `invoke` on a thread pool (one thread per in-flight question,
+as Streamlit does); the async path runs every question with `ainvoke` on a
+single event loop. `--mode single_shot` benchmarks the retrieve-then-generate graph.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fakes import FakeSQLChatModel, SlowFakeEmbeddings
+from src import vector_store
+from src.agents import build_agent, build_single_shot_agent
+from src.vector_store import IndexRegistry
+
+
+def run_sync(app, questions, threads):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda q: app.invoke({"messages": [HumanMessage(content=q)]}), questions))
+    return time.perf_counter() - started
+
+
+async def run_async(app, questions, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(question):
+        async with semaphore:
+            return await app.ainvoke({"messages": [HumanMessage(content=question)]})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=4, help="worker threads for the sync path")
+    parser.add_argument("--concurrency", type=int, default=0, help="in-flight questions on the async path (0 = all)")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--mode", choices=("agent", "single_shot"), default="agent")
+    args = parser.parse_args()
+
+    vector_store.index_registry = IndexRegistry(
+        lambda: SlowFakeEmbeddings(size=1536, latency=args.embed_latency)
+    )
+    build = build_agent if args.mode == "agent" else build_single_shot_agent
+    app = build(FakeSQLChatModel(latency=args.llm_latency))
+    questions = [f"How many employees were hired in {1985 + i % 15} (run {i})?" for i in range(args.questions)]
+
+    # Load the index once outside the timed region.
+    app.invoke({"messages": [HumanMessage(content="warm-up")]})
+
+    sync_seconds = run_sync(app, questions, args.threads)
+    async_seconds = asyncio.run(run_async(app, questions, args.concurrency or len(questions)))
+
+    print(json.dumps({
+        "questions": args.questions,
+        "mode": args.mode,
+        "llm_latency": args.llm_latency,
+        "embed_latency": args.embed_latency,
+        "sync": {"threads": args.threads, "seconds": round(sync_seconds, 3),
+                 "questions_per_second": round(args.questions / sync_seconds, 2)},
+        "async": {"concurrency": args.concurrency or args.questions, "seconds": round(async_seconds, 3),
+                  "questions_per_second": round(args.questions / async_seconds, 2)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Per-batch latency of the resident reranker under concurrent sessions.
+
+    python -m benchmarks.bench_reranker --sessions 16 --requests 8 --docs 10
+    python -m benchmarks.bench_reranker --real   # load the actual cross-encoder
+
+Each session thread reranks `--docs` documents per request; identical pairs
+hit the score cache, so questions are made unique per request.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeCrossEncoder
+from src.reranker import RerankerService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=8, help="requests per session")
+    parser.add_argument("--docs", type=int, default=10, help="documents per request")
+    parser.add_argument("--batch-wait-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads for --real")
+    parser.add_argument("--real", action="store_true", help="use the sentence-transformers cross-encoder")
+    args = parser.parse_args()
+
+    kwargs = {"batch_wait_ms": args.batch_wait_ms, "max_batch": args.max_batch, "threads": args.threads}
+    if not args.real:
+        kwargs["model_factory"] = lambda name, threads: FakeCrossEncoder()
+    service = RerankerService(**kwargs)
+    service.model  # load outside the timed region
+
+    docs = [f"## Table Name: `table_{i}` with columns emp_no, salary, from_date, to_date" for i in range(args.docs)]
+
+    def session(s):
+        latencies = []
+        for r in range(args.requests):
+            started = time.perf_counter()
+            service.rerank(f"session {s} request {r}: average salary per department", docs, top_k=3)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        latencies = sorted(l for ls in pool.map(session, range(args.sessions)) for l in ls)
+    wall = time.perf_counter() - started
+
+    print(json.dumps({
+        "sessions": args.sessions,
+        "requests": len(latencies),
+        "wall_seconds": round(wall, 3),
+        "request_ms_p50": round(latencies[len(latencies) // 2] * 1000, 2),
+        "request_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        **{k: round(v, 3) if isinstance(v, float) else v for k, v in service.stats().items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Memory and conversion cost of a large query result: NumPy/object dtypes vs. Arrow-backed.
+
+    python -m benchmarks.bench_results --rows 1000000
+
+Reads salaries joined to employees, departments and titles (names, gender,
+department, title, dates) from a synthetic SQLite employees database in two
+ways, each in a fresh interpreter:
+
+- "numpy": `pd.read_sql`, i.e. int64 and Python-object strings, as
+  `run_query_df` returned before results were Arrow-backed;
+- "arrow": `run_query_df`, Arrow-backed columns with downcast integers and
+  dictionary-encoded low-cardinality text.
+
+Reported per variant: load time, DataFrame memory (`memory_usage(deep=True)`),
+peak allocation while loading (Python heap via tracemalloc plus the Arrow
+memory pool) and the time to build the Arrow table `st.dataframe` sends.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+_work_dir = Path(os.environ.get("BENCH_DIR") or Path(tempfile.gettempdir()) / "text2sql-bench")
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{_work_dir.as_posix()}/{{database}}.db"
+os.environ.setdefault("QUERY_TIMEOUT_SECONDS", "0")
+
+SQL = """
+SELECT e.emp_no, e.first_name, e.last_name, e.gender, d.dept_name, t.title, s.salary, s.from_date, s.to_date
+FROM salaries s
+JOIN employees e ON e.emp_no = s.emp_no
+JOIN dept_emp de ON de.emp_no = e.emp_no
+JOIN departments d ON d.dept_no = de.dept_no
+JOIN titles t ON t.emp_no = e.emp_no
+"""
+MB = 1 << 20
+
+
+def run_variant(variant: str, database: str) -> dict:
+    import pandas as pd
+    import pyarrow as pa
+
+    from src.dataframes import dataframe_to_table
+    from src.sql import guarded_connection, run_query_df
+
+    def load():
+        if variant == "numpy":
+            with guarded_connection(database) as conn:
+                return pd.read_sql(SQL, conn)
+        return run_query_df(SQL, database, use_cache=False)
+
+    load()  # warm the page cache and the connection pool
+    started = time.perf_counter()
+    df = load()
+    load_seconds = time.perf_counter() - started
+    del df
+
+    pool = pa.default_memory_pool()
+    arrow_before = pool.bytes_allocated()
+    tracemalloc.start()
+    df = load()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    table = dataframe_to_table(df)
+    to_arrow_seconds = time.perf_counter() - started
+    return {
+        "rows": len(df),
+        "dtypes": {name: str(dtype) for name, dtype in df.dtypes.items()},
+        "load_s": round(load_seconds, 3),
+        "dataframe_mb": round(df.memory_usage(deep=True).sum() / MB, 1),
+        "peak_load_mb": round((python_peak + pool.max_memory() - arrow_before) / MB, 1),
+        "to_arrow_s": round(to_arrow_seconds, 4),
+        "arrow_table_mb": round(table.nbytes / MB, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="salary rows (= result rows)")
+    parser.add_argument("--variant", choices=("numpy", "arrow"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    database = f"employees_{args.rows}"
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, database)))
+        return
+
+    db_path = _work_dir / f"{database}.db"
+    if not db_path.exists():
+        from benchmarks.synthetic_db import create_employees_db
+        create_employees_db(db_path, salaries=args.rows)
+
+    report = {}
+    for variant in ("numpy", "arrow"):
+        proc = subprocess.run([sys.executable, "-m", "benchmarks.bench_results", "--rows", str(args.rows),
+                               "--variant", variant], capture_output=True, text=True, check=True)
+        report[variant] = json.loads(proc.stdout.strip().splitlines()[-1])
+    report["dataframe_ratio"] = round(report["numpy"]["dataframe_mb"] / max(report["arrow"]["dataframe_mb"], 0.1), 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
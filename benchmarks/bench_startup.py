@@ -0,0 +1,117 @@
+"""
+Cold-start import cost of the Streamlit app, with a budget.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 5 --budget-ms 2500
+
+Imports the repository modules `text2sql.py` imports (streamlit itself is left
+out) in a fresh interpreter, `--repeat` times, and reports the wall time of the
+imports, the slowest packages according to `python -X importtime`, and which
+of HEAVY_MODULES got loaded. Those are meant to be imported on first use only,
+so the run exits with status 1 when any of them is loaded at startup or when
+the median import time exceeds `--budget-ms`.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APP = ROOT / "text2sql.py"
+DEFAULT_BUDGET_MS = 3000
+# Packages that must stay off the startup path: LLM/embedding clients, graph compilation, vector indexes, the reranker.
+HEAVY_MODULES = (
+    "langchain_openai", "openai", "langgraph.graph", "langgraph.prebuilt", "langchain_community",
+    "faiss", "torch", "sentence_transformers",
+)
+
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+{imports}
+print(json.dumps({{"ms": (time.perf_counter() - started) * 1000, "modules": sorted(sys.modules)}}))
+"""
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def app_modules(path=APP) -> list[str]:
+    """Repository modules (`src.*`, `config.*`) imported at the top of the app script."""
+    modules = []
+    for node in ast.parse(Path(path).read_text(encoding="utf-8")).body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(name for name in names if name.split(".")[0] in ("src", "config"))
+    return list(dict.fromkeys(modules))
+
+
+def import_once(modules: list[str]) -> tuple[dict, str]:
+    """Import `modules` in a new interpreter; returns its report and the `-X importtime` output."""
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "sk-offline-benchmark"}
+    code = _CHILD.format(imports="\n".join(f"import {module}" for module in modules))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"importing the app modules failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def slowest_packages(importtime: str, top: int = 10) -> dict[str, float]:
+    """Self import time per top-level package, in milliseconds."""
+    per_package = Counter()
+    for self_us, _, name in _IMPORT_TIME.findall(importtime):
+        per_package[name.split(".")[0]] += int(self_us)
+    return {name: round(us / 1000, 1) for name, us in per_package.most_common(top)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="allowed median import time")
+    parser.add_argument("--top", type=int, default=10, help="packages to list by import time")
+    args = parser.parse_args(argv)
+
+    modules = app_modules()
+    timings = []
+    for i in range(args.repeat):
+        report, importtime = import_once(modules)
+        timings.append(report["ms"])
+        if i == 0:
+            loaded = set(report["modules"])
+            heavy = [name for name in HEAVY_MODULES if name in loaded]
+            packages = slowest_packages(importtime, args.top)
+    timings.sort()
+
+    result = {
+        "modules": modules,
+        "repeat": args.repeat,
+        "min_ms": round(timings[0], 1),
+        "median_ms": round(statistics.median(timings), 1),
+        "max_ms": round(timings[-1], 1),
+        "budget_ms": args.budget_ms,
+        "heavy_modules_loaded": heavy,
+        "slowest_packages_ms": packages,
+    }
+    print(json.dumps(result, indent=2))
+
+    failures = []
+    if result["median_ms"] > args.budget_ms:
+        failures.append(f"median import time {result['median_ms']:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    if heavy:
+        failures.append(f"loaded at startup: {', '.join(heavy)}")
+    if failures:
+        print("; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
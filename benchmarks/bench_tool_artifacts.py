@@ -0,0 +1,75 @@
+"""
+Recovering retrieved documents: regex over `str(list[Document])` vs. the tool artifact.
+
+    python -m benchmarks.bench_tool_artifacts --sizes 5 50 500 --repeat 20
+
+Documents carry SQL with quotes in their metadata, as the sample queries do.
+`recovered` shows how many of the documents each path actually returns.
+"""
+import argparse
+import json
+import time
+
+from langchain_core.documents import Document
+from langchain_core.messages import ToolMessage
+
+from src.utils import tool_messages_to_documents, tool_messages_to_documents_json
+
+
+def make_documents(n: int) -> list[Document]:
+    docs = []
+    for i in range(n):
+        if i % 2:
+            docs.append(Document(
+                page_content=f"Find employees named O'Brien hired in {1985 + i % 15}.",
+                metadata={
+                    "sql": f"SELECT * FROM employees WHERE last_name = 'O''Brien' AND YEAR(hire_date) = {1985 + i % 15};",
+                    "source": "queries.json", "index": i, "type": "sample-queries", "token_count": 12,
+                },
+            ))
+        else:
+            docs.append(Document(
+                page_content="## Table Name: `salaries`\n\n- **Description**: Details the salary history of each employee.\n" * 3,
+                metadata={"source": "data/tables/salaries.md", "table_name": "salaries", "index": i,
+                          "type": "tables-info", "token_count": 120},
+            ))
+    return docs
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        docs = make_documents(n)
+        artifact = [{"page_content": d.page_content, "metadata": d.metadata} for d in docs]
+        legacy = [ToolMessage(content=str(docs), name="combined_retriever", tool_call_id="call_1")]
+        structured = [ToolMessage(content=str(docs), artifact=artifact, name="combined_retriever", tool_call_id="call_1")]
+
+        regex_seconds = best_of(lambda: tool_messages_to_documents_json(legacy), args.repeat)
+        artifact_seconds = best_of(lambda: tool_messages_to_documents(structured), args.repeat)
+        results.append({
+            "documents": n,
+            "payload_chars": len(legacy[0].content),
+            "regex": {"ms": round(regex_seconds * 1000, 4), "recovered": len(tool_messages_to_documents_json(legacy))},
+            "artifact": {"ms": round(artifact_seconds * 1000, 4), "recovered": len(tool_messages_to_documents(structured))},
+            "speedup": round(regex_seconds / artifact_seconds, 1) if artifact_seconds else None,
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Deterministic, offline stand-ins for the OpenAI chat and embedding models."""
+import asyncio
+import json
+import time
+import uuid
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+
+class FakeSQLChatModel(BaseChatModel):
+    """
+    Chat model that mimics the text2sql agent's two calls: the first asks for
+    `combined_retriever` with the user question, the second answers with a
+    `SQLResponse` JSON. `latency` seconds are spent per call (slept, or awaited
+    on the async path). When streamed, the answer arrives in small chunks
+    `token_latency` seconds apart after the first `latency` seconds.
+    """
+
+    latency: float = 0.2
+    token_latency: float = 0.0
+    sql_query: str = "SELECT COUNT(*) AS employee_count FROM employees;"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-sql"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs):
+        def parse(message):
+            parsed = schema.model_validate_json(message.content)
+            return {"raw": message, "parsed": parsed, "parsing_error": None} if include_raw else parsed
+
+        return self | RunnableLambda(parse)
+
+    def _reply(self, messages) -> AIMessage:
+        usage = {"input_tokens": 350, "output_tokens": 30, "total_tokens": 380}
+        if any(isinstance(m, ToolMessage) for m in messages):
+            content = json.dumps({"sql_query": self.sql_query, "explanation": "Uses the 'employees' table."})
+            return AIMessage(content=content, usage_metadata=usage)
+        return AIMessage(
+            content="",
+            tool_calls=[{
+                "name": "combined_retriever",
+                "args": {"user_query": messages[-1].content},
+                "id": f"call_{uuid.uuid4().hex}",
+                "type": "tool_call",
+            }],
+            usage_metadata=usage,
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        reply = self._reply(messages)
+        if reply.tool_calls:
+            call = reply.tool_calls[0]
+            chunks = [AIMessageChunk(content="", tool_call_chunks=[{
+                "name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0,
+            }])]
+        else:
+            chunks = [AIMessageChunk(content=reply.content[i:i + 8]) for i in range(0, len(reply.content), 8)]
+        chunks[-1].usage_metadata = reply.usage_metadata
+        for i, message in enumerate(chunks):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=message)
+            if run_manager:
+                run_manager.on_llm_new_token(message.content, chunk=chunk)
+            yield chunk
+
+
+class SlowFakeEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic hash-based embeddings that spend `latency` seconds per request."""
+
+    latency: float = 0.0
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return super().embed_query(text)
+
+    async def aembed_documents(self, texts):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return super().embed_documents(texts)
+
+    async def aembed_query(self, text):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return super().embed_query(text)
+
+
+class FakeCrossEncoder:
+    """
+    Stand-in for `sentence_transformers.CrossEncoder`: a fixed per-call overhead
+    plus a per-pair cost, mimicking how batched inference amortizes overhead.
+    Scores are the word overlap between query and document.
+    """
+
+    def __init__(self, overhead: float = 0.01, per_pair: float = 0.001):
+        self.overhead = overhead
+        self.per_pair = per_pair
+
+    def predict(self, pairs):
+        time.sleep(self.overhead + self.per_pair * len(pairs))
+        return [len(set(q.lower().split()) & set(d.lower().split())) for q, d in pairs]
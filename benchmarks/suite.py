@@ -0,0 +1,235 @@
+"""
+Offline benchmark suite for the hot paths, with a regression gate.
+
+    python -m benchmarks.suite -o bench.json
+    python -m benchmarks.suite --baseline bench.json --max-regression 0.25
+    python -m benchmarks.suite --docs 5000 --rows 10000 1000000 --repeat 10
+
+Everything runs locally: embeddings are deterministic fakes, the cross-encoder
+is `FakeCrossEncoder`, and queries run against a synthetic SQLite copy of the
+employees schema (see `benchmarks/synthetic_db.py`). Each case reports
+min/median/p95 milliseconds. With `--baseline`, the run exits with status 1
+when the median of any case shared with the baseline is more than
+`--max-regression` slower.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+
+_work_dir = Path(os.environ.get("BENCH_DIR") or Path(tempfile.gettempdir()) / "text2sql-bench")
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{_work_dir.as_posix()}/{{database}}.db"
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.messages import ToolMessage
+
+from benchmarks.bench_tool_artifacts import make_documents
+from benchmarks.fakes import FakeCrossEncoder, SlowFakeEmbeddings
+from benchmarks.synthetic_db import create_employees_db
+from src import retrieval, tools, vector_store
+from src.mmap_store import MmapVectorStore, write_mmap_store
+from src.paging import QueryPager, page_sql
+from src.reranker import RerankerService
+from src.sql import run_query_df
+from src.utils import tool_messages_to_documents, tool_messages_to_documents_json
+from src.vector_store import IndexRegistry
+
+EMBEDDING_SIZE = 1536
+# Changes below this many milliseconds are treated as noise by the gate.
+NOISE_FLOOR_MS = 0.05
+
+
+def measure(fn, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(timings[0], 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[min(int(len(timings) * 0.95), len(timings) - 1)], 4),
+    }
+
+
+def _build_indexes(n_docs: int, embeddings) -> tuple[Path, Path]:
+    """Save the same `n_docs` documents as a LangChain FAISS index and as an mmap store."""
+    docs = make_documents(n_docs)
+    vectors = embeddings.embed_documents([doc.page_content + str(i) for i, doc in enumerate(docs)])
+    faiss_dir = _work_dir / f"faiss-{n_docs}"
+    mmap_dir = _work_dir / f"mmap-{n_docs}"
+    FAISS.from_embeddings(
+        text_embeddings=[(doc.page_content, vector) for doc, vector in zip(docs, vectors)],
+        embedding=embeddings,
+        metadatas=[doc.metadata for doc in docs],
+    ).save_local(faiss_dir)
+    write_mmap_store(mmap_dir, docs, vectors, ids=[str(i) for i in range(n_docs)])
+    return faiss_dir, mmap_dir
+
+
+def bench_vector_stores(n_docs: int, repeat: int) -> dict:
+    embeddings = SlowFakeEmbeddings(size=EMBEDDING_SIZE)
+    faiss_dir, mmap_dir = _build_indexes(n_docs, embeddings)
+    query = embeddings.embed_query("average salary per department")
+
+    faiss_store = FAISS.load_local(faiss_dir, embeddings, allow_dangerous_deserialization=True)
+    mmap_store = MmapVectorStore(mmap_dir, embeddings)
+    return {
+        f"faiss_load_local[{n_docs}]": measure(
+            lambda: FAISS.load_local(faiss_dir, embeddings, allow_dangerous_deserialization=True), repeat),
+        f"mmap_open[{n_docs}]": measure(lambda: MmapVectorStore(mmap_dir, embeddings), repeat),
+        f"faiss_search[{n_docs}]": measure(lambda: faiss_store.similarity_search_by_vector(query, k=5), repeat * 10),
+        f"mmap_search[{n_docs}]": measure(lambda: mmap_store.similarity_search_by_vector(query, k=5), repeat * 10),
+    }
+
+
+def bench_tool_messages(n_docs: int, repeat: int) -> dict:
+    docs = make_documents(n_docs)
+    artifact = [{"page_content": d.page_content, "metadata": d.metadata} for d in docs]
+    legacy = [ToolMessage(content=str(docs), name="combined_retriever", tool_call_id="call_1")]
+    structured = [ToolMessage(content=str(docs), artifact=artifact, name="combined_retriever", tool_call_id="call_1")]
+    return {
+        f"tool_messages_to_documents_json[{n_docs}]": measure(lambda: tool_messages_to_documents_json(legacy), repeat),
+        f"tool_messages_to_documents[{n_docs}]": measure(lambda: tool_messages_to_documents(structured), repeat),
+    }
+
+
+def bench_reranker_retriever(repeat: int) -> dict:
+    """`reranker_retriever` end to end: fused search over two indexes, then cross-encoder scoring of fresh pairs."""
+    embeddings = SlowFakeEmbeddings(size=EMBEDDING_SIZE)
+    _, tables_dir = _build_indexes(50, embeddings)
+    retrieval.register_source("tables", tables_dir)
+    retrieval.register_source("sample_queries", tables_dir)
+    vector_store.index_registry = IndexRegistry(lambda: embeddings)
+    service = RerankerService(model_factory=lambda name, threads: FakeCrossEncoder(overhead=0.002, per_pair=0.0002))
+    tools.get_reranker = lambda: service
+    tools.TESTING = False
+
+    counter = iter(range(10 ** 9))
+    result = {
+        "reranker_retriever": measure(
+            lambda: tools.reranker_retriever(f"average salary per department #{next(counter)}"), repeat),
+    }
+    result["reranker_retriever"]["avg_pairs_per_batch"] = round(service.stats()["avg_pairs_per_batch"], 2)
+    return result
+
+
+def bench_run_query_df(rows: int, repeat: int) -> dict:
+    database = f"employees_{rows}"
+    db_path = _work_dir / f"{database}.db"
+    if not db_path.exists():
+        create_employees_db(db_path, salaries=rows)
+    sql = f"SELECT emp_no, salary, from_date, to_date FROM salaries LIMIT {rows}"
+    result = {
+        f"run_query_df[{rows}]": measure(lambda: run_query_df(sql, database, use_cache=False), repeat),
+        f"run_query_df_cached[{rows}]": measure(lambda: run_query_df(sql, database), repeat),
+    }
+    df = run_query_df(sql, database, use_cache=False)
+    result[f"run_query_df[{rows}]"]["result_mb"] = round(df.memory_usage(deep=True).sum() / (1 << 20), 2)
+    return result
+
+
+def bench_paging(rows: int, repeat: int, page_size: int = 100) -> dict:
+    """First vs. last page of `salaries`, with keyset pagination and with LIMIT/OFFSET."""
+    database = f"employees_{rows}"
+    db_path = _work_dir / f"{database}.db"
+    if not db_path.exists():
+        create_employees_db(db_path, salaries=rows)
+    pager = QueryPager("SELECT emp_no, salary, from_date, to_date FROM salaries", database, page_size)
+    last = rows // page_size - 1
+    for number in range(last):
+        pager.page(number)
+    after = pager._cursors[last]
+    keyset_first = page_sql(pager.plan, page_size + 1)
+    keyset_last = page_sql(pager.plan, page_size + 1, after=after)
+    offset_plan = replace(pager.plan, mode="offset")
+    offset_last = page_sql(offset_plan, page_size + 1, offset=last * page_size)
+    return {
+        f"page_keyset_first[{rows}]": measure(lambda: run_query_df(keyset_first, database, use_cache=False), repeat),
+        f"page_keyset_last[{rows}]": measure(lambda: run_query_df(keyset_last, database, use_cache=False), repeat),
+        f"page_offset_last[{rows}]": measure(lambda: run_query_df(offset_last, database, use_cache=False), repeat),
+    }
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[dict]:
+    """Cases whose median is more than `max_regression` (a fraction) slower than in `baseline`."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        ratio = current["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        if ratio > 1 + max_regression and current["median_ms"] - before["median_ms"] > NOISE_FLOOR_MS:
+            regressions.append({"case": name, "baseline_ms": before["median_ms"],
+                                "current_ms": current["median_ms"], "ratio": round(ratio, 2)})
+    return regressions
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, nargs="+", default=[1000], help="index sizes for load/search")
+    parser.add_argument("--payload-docs", type=int, default=500, help="documents in the tool message payload")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000], help="result sizes for run_query_df")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write the JSON results here as well")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed slowdown of the median, as a fraction")
+    args = parser.parse_args(argv)
+
+    _work_dir.mkdir(parents=True, exist_ok=True)
+    results = {}
+    for n_docs in args.docs:
+        results.update(bench_vector_stores(n_docs, args.repeat))
+    results.update(bench_tool_messages(args.payload_docs, args.repeat))
+    results.update(bench_reranker_retriever(args.repeat * 4))
+    for rows in args.rows:
+        # Large results dominate the wall time; fewer repeats keep the suite short.
+        results.update(bench_run_query_df(rows, args.repeat if rows <= 100_000 else max(args.repeat // 2, 2)))
+        results.update(bench_paging(rows, args.repeat))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        report["regressions"] = compare(results, baseline, args.max_regression)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    if report.get("regressions"):
+        print(f"{len(report['regressions'])} case(s) regressed by more than {args.max_regression:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+SQLite copy of the MySQL `employees` schema filled with synthetic rows.
+
+    python -m benchmarks.synthetic_db /tmp/employees.db --salaries 1000000
+
+Rows are generated from a seeded RNG, so the same arguments always produce
+the same database.
+"""
+import argparse
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE employees (
+    emp_no INTEGER PRIMARY KEY, birth_date DATE NOT NULL, first_name VARCHAR(14) NOT NULL,
+    last_name VARCHAR(16) NOT NULL, gender CHAR(1) NOT NULL, hire_date DATE NOT NULL
+);
+CREATE TABLE departments (dept_no CHAR(4) PRIMARY KEY, dept_name VARCHAR(40) NOT NULL UNIQUE);
+CREATE TABLE dept_emp (
+    emp_no INTEGER NOT NULL REFERENCES employees (emp_no), dept_no CHAR(4) NOT NULL REFERENCES departments (dept_no),
+    from_date DATE NOT NULL, to_date DATE NOT NULL, PRIMARY KEY (emp_no, dept_no)
+);
+CREATE TABLE dept_manager (
+    emp_no INTEGER NOT NULL REFERENCES employees (emp_no), dept_no CHAR(4) NOT NULL REFERENCES departments (dept_no),
+    from_date DATE NOT NULL, to_date DATE NOT NULL, PRIMARY KEY (emp_no, dept_no)
+);
+CREATE TABLE titles (
+    emp_no INTEGER NOT NULL REFERENCES employees (emp_no), title VARCHAR(50) NOT NULL,
+    from_date DATE NOT NULL, to_date DATE, PRIMARY KEY (emp_no, title, from_date)
+);
+CREATE TABLE salaries (
+    emp_no INTEGER NOT NULL REFERENCES employees (emp_no), salary INTEGER NOT NULL,
+    from_date DATE NOT NULL, to_date DATE NOT NULL, PRIMARY KEY (emp_no, from_date)
+);
+"""
+
+DEPARTMENTS = [
+    ("d001", "Marketing"), ("d002", "Finance"), ("d003", "Human Resources"), ("d004", "Production"),
+    ("d005", "Development"), ("d006", "Quality Management"), ("d007", "Sales"), ("d008", "Research"),
+    ("d009", "Customer Service"),
+]
+TITLES = ["Engineer", "Senior Engineer", "Staff", "Senior Staff", "Assistant Engineer", "Technique Leader", "Manager"]
+FIRST_NAMES = ["Georgi", "Bezalel", "Parto", "Chirstian", "Kyoichi", "Anneke", "Tzvetan", "Saniya", "Sumant", "Duangkaew"]
+LAST_NAMES = ["Facello", "Simmel", "Bamford", "Koblick", "Maliniak", "Preusig", "Zielinski", "Kalloufi", "Peac", "Baaz"]
+CURRENT = "9999-01-01"
+
+
+def _day(rng: random.Random, start: date, span_days: int) -> str:
+    return (start + timedelta(days=rng.randrange(span_days))).isoformat()
+
+
+def create_employees_db(path, salaries: int = 10_000, salaries_per_employee: int = 10, seed: int = 0) -> dict:
+    """
+    Create (or replace) a SQLite employees database with `salaries` salary rows.
+
+    Args:
+        path: Database file to write.
+        salaries: Number of rows in `salaries`, the largest table.
+        salaries_per_employee: Salary history length; sets the number of employees.
+        seed: RNG seed.
+
+    Returns:
+        dict: Row count per table and the build time.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    rng = random.Random(seed)
+    employees = max(-(-salaries // salaries_per_employee), 1)
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(path)
+    conn.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + SCHEMA)
+    with conn:
+        conn.executemany("INSERT INTO departments VALUES (?, ?)", DEPARTMENTS)
+        conn.executemany("INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?)", (
+            (10001 + i, _day(rng, date(1952, 1, 1), 4700), rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+             rng.choice("MF"), _day(rng, date(1985, 1, 1), 5000))
+            for i in range(employees)
+        ))
+        conn.executemany("INSERT INTO dept_emp VALUES (?, ?, ?, ?)", (
+            (10001 + i, DEPARTMENTS[i % len(DEPARTMENTS)][0], "1990-01-01", CURRENT) for i in range(employees)
+        ))
+        conn.executemany("INSERT INTO dept_manager VALUES (?, ?, ?, ?)", (
+            (10001 + i, dept_no, "1990-01-01", CURRENT) for i, (dept_no, _) in enumerate(DEPARTMENTS[:employees])
+        ))
+        conn.executemany("INSERT INTO titles VALUES (?, ?, ?, ?)", (
+            (10001 + i, TITLES[i % len(TITLES)], "1990-01-01", CURRENT) for i in range(employees)
+        ))
+
+        def salary_rows():
+            for n in range(salaries):
+                emp, year = divmod(n, salaries_per_employee)
+                to_date = CURRENT if year == salaries_per_employee - 1 else f"{1991 + year}-01-01"
+                yield 10001 + emp, rng.randrange(40000, 160000), f"{1990 + year}-01-01", to_date
+        conn.executemany("INSERT INTO salaries VALUES (?, ?, ?, ?)", salary_rows())
+    conn.close()
+
+    return {
+        "path": str(path),
+        "employees": employees,
+        "salaries": salaries,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--salaries", type=int, default=10_000)
+    parser.add_argument("--salaries-per-employee", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(create_employees_db(args.path, args.salaries, args.salaries_per_employee, args.seed))
+
+
+if __name__ == "__main__":
+    main()
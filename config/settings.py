@@ -4,7 +4,8 @@ from dotenv import load_dotenv
 import yaml
 
 def load_yaml():
-    yaml_path = Path("config/config.yml")
+    # Next to this file, so the app can be started from any working directory
+    yaml_path = Path(__file__).resolve().parent / "config.yml"
 
     if not yaml_path.exists():
         raise FileNotFoundError(f"YAML file not found: {yaml_path.resolve()}")
@@ -25,8 +26,11 @@ INPUT_DATA_SAMPLE_DIR = _BASE_DIR / "data/sample_queries"
 VECTOR_DB_DIR_TABLES = _BASE_DIR / "vector_db/TABLES"
 VECTOR_DB_DIR_SAMPLEQ = _BASE_DIR / "vector_db/SAMPLEQ_DB"
 VECTOR_DB_COMBINE = _BASE_DIR / "vector_db/COMBINED_DB"
+VECTOR_DB_MANIFEST = _BASE_DIR / "vector_db/manifest.json"
+VECTOR_DB_BUILDS_DIR = _BASE_DIR / "vector_db/builds"
 RAG_DIR = _BASE_DIR / "rag"
 TEST_OUTPUT_DIR = _BASE_DIR/"tests/dummy_outputs"
+CACHE_DIR = _BASE_DIR / "cache"
 
 
 # Ensure directories exist
@@ -37,18 +41,88 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE_MAX_SIZE = int(os.getenv("LOG_FILE_MAX_SIZE", "10485760"))  # 10MB
 LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 
+# Metrics
+METRICS_FILE = Path(os.getenv("METRICS_FILE", LOGS_DIR / "metrics.prom"))  # OpenMetrics text, rewritten per request
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # serve /metrics over HTTP, 0 = disabled
+REQUEST_LOG_FILE = Path(os.getenv("REQUEST_LOG_FILE", LOGS_DIR / "requests.jsonl"))  # one JSON record per request
+
 # Application settings
 DEBUG = False
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 TESTING = True
 
+# Database settings
+DATABASE_URL = os.getenv("DATABASE_URL")  # overrides the MySQL URL, may contain "{database}"
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "3306"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, keep below MySQL wait_timeout
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", "2"))  # connections opened when an engine is created
+QUERY_CHUNK_SIZE = int(os.getenv("QUERY_CHUNK_SIZE", "10000"))  # rows per streamed result chunk
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "30"))  # execution deadline per query, 0 = none
+QUERY_EXPORT_TIMEOUT_SECONDS = float(os.getenv("QUERY_EXPORT_TIMEOUT_SECONDS", "600"))  # deadline for full-result exports
+EXPORT_DIR = CACHE_DIR / "exports"
+EXPORT_MAX_AGE_SECONDS = float(os.getenv("EXPORT_MAX_AGE_SECONDS", "3600"))  # older export files are deleted
+EXPORT_KEEP_FILES = int(os.getenv("EXPORT_KEEP_FILES", "20"))  # at most this many export files are kept
+EXPORT_DOWNLOAD_MAX_BYTES = int(os.getenv("EXPORT_DOWNLOAD_MAX_BYTES", "104857600"))  # 100MB, larger exports stay on the server
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "600"))  # seconds
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", "268435456"))  # 256MB of compressed results
+RESULT_CACHE_MAX_ROWS = int(os.getenv("RESULT_CACHE_MAX_ROWS", "100000"))  # larger results are not cached
+RESULT_ARROW_DTYPES = os.getenv("RESULT_ARROW_DTYPES", "true").lower() == "true"  # pyarrow-backed, compacted result columns
+RESULT_DICTIONARY_RATIO = float(os.getenv("RESULT_DICTIONARY_RATIO", "0.5"))  # dictionary-encode text columns with at most this share of distinct values
+SCHEMA_CACHE_DIR = CACHE_DIR / "schema"
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "300"))  # seconds between catalog checks
+SCHEMA_RETRY_INTERVAL = float(os.getenv("SCHEMA_RETRY_INTERVAL", "30"))  # seconds before retrying an unreachable catalog
+
 # RAG specific settings
 EMBEDDING_MODEL = 'text-embedding-3-small'
 CHUNK_SIZE = 2000
 CHUNK_OVERLAP = 100
 COLLECTION_NAME = "mysql_employees_tables"
+EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", CACHE_DIR / "embeddings.sqlite3"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", "104857600"))  # 100MB
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))  # texts per embedding request in index builds
+RETRIEVAL_MAX_WORKERS = int(os.getenv("RETRIEVAL_MAX_WORKERS", "8"))  # concurrent index searches
+RRF_K = int(os.getenv("RRF_K", "60"))  # reciprocal-rank fusion damping constant
+RETRIEVAL_STRATEGY = os.getenv("RETRIEVAL_STRATEGY", "vector")  # "vector", "lexical" or "hybrid"
+LEXICAL_CONFIDENCE_THRESHOLD = float(os.getenv("LEXICAL_CONFIDENCE_THRESHOLD", "0.8"))  # hybrid skips FAISS above this
+BM25_K1 = 1.2
+BM25_B = 0.75
+SCHEMA_CONTEXT_ENABLED = os.getenv("SCHEMA_CONTEXT_ENABLED", "true").lower() == "true"  # tables + join path instead of table docs
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))  # retrieved context sent to the model, 0 = unlimited
+COMBINED_K = int(os.getenv("COMBINED_K", "5"))  # documents returned by combined_retriever
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"  # cross-encoder stage after combined_retriever
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "10"))  # candidates fetched for reranking
+RERANKER_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+RERANKER_THREADS = int(os.getenv("RERANKER_THREADS", "0"))  # torch CPU threads, 0 = library default
+RERANKER_BATCH_WAIT_MS = float(os.getenv("RERANKER_BATCH_WAIT_MS", "5"))
+RERANKER_MAX_BATCH = int(os.getenv("RERANKER_MAX_BATCH", "64"))  # pairs per predict call
+RERANKER_CACHE_SIZE = int(os.getenv("RERANKER_CACHE_SIZE", "10000"))
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))  # per database
+SEMANTIC_CACHE_DIR = CACHE_DIR / "semantic"
+VECTOR_STORE_FORMAT = os.getenv("VECTOR_STORE_FORMAT", "mmap")  # written by src.build_index: "mmap" or "faiss"
+VECTOR_DB_RELOAD_INTERVAL = float(os.getenv("VECTOR_DB_RELOAD_INTERVAL", "2"))  # seconds between on-disk change checks
 
 # LLM
 MODEL = 'gpt-4.1-nano-2025-04-14'
+GRAPH_MODE = os.getenv("GRAPH_MODE", "agent")  # "agent" (tool calling) or "single_shot" (retrieve then generate)
+
+# Query cost guard (EXPLAIN before executing generated SQL)
+QUERY_GUARD_ENABLED = os.getenv("QUERY_GUARD_ENABLED", "true").lower() == "true"
+QUERY_WARN_ROWS = int(os.getenv("QUERY_WARN_ROWS", "1000000"))  # estimated rows examined before warning
+QUERY_LIMIT_ROWS = int(os.getenv("QUERY_LIMIT_ROWS", "10000000"))  # ... before capping the result
+QUERY_REJECT_ROWS = int(os.getenv("QUERY_REJECT_ROWS", "100000000"))  # ... before refusing to run
+QUERY_AUTO_LIMIT = int(os.getenv("QUERY_AUTO_LIMIT", "10000"))  # result rows kept for "limit" verdicts
+QUERY_REWRITE_ATTEMPTS = int(os.getenv("QUERY_REWRITE_ATTEMPTS", "1"))  # agent rewrites of limit/reject queries
+QUERY_PAGE_SIZE = int(os.getenv("QUERY_PAGE_SIZE", "100"))  # rows fetched per result page in the UI
+
+# Batch translation (python -m src.batch)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_RATE_LIMIT = float(os.getenv("BATCH_RATE_LIMIT", "2"))  # questions started per second, 0 = unlimited
 
 SYSTEM_PROMPT = _config.get('prompts').get('system_prompt')
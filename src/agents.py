@@ -1,16 +1,31 @@
 from typing import TypedDict, Annotated, Sequence
+import asyncio
+import hashlib
 import operator
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage
-from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
+import threading
+import time
+import uuid
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage, AIMessageChunk, ToolMessage
+from langgraph.constants import END
 from pydantic import BaseModel, Field
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.json import parse_json_markdown
 
-from config.settings import MODEL, SYSTEM_PROMPT
+from config.logging_config import get_logger
+from config.settings import (
+    MODEL, SYSTEM_PROMPT, SEMANTIC_CACHE_ENABLED, GRAPH_MODE, QUERY_GUARD_ENABLED, QUERY_REWRITE_ATTEMPTS,
+    VECTOR_DB_COMBINE,
+)
+from src.embeddings import get_embeddings
+from src.metrics import GraphMetricsHandler, request_scope
+from src.query_guard import GuardResult, guard_query, rewrite_feedback
+from src.schema import get_schema
 from src.tools import combined_retriever
+from src.utils import tool_messages_to_documents
+from src.vector_store import index_checksum
+
+logger = get_logger('src.agents')
 
 
 class AgentState(TypedDict):
@@ -28,28 +43,40 @@ text2sql_prompt = SYSTEM_PROMPT.format(format_instructions=parser.get_format_ins
 
 tools = [combined_retriever]
 
-llm = ChatOpenAI(model=MODEL, temperature=0)
-llm_with_tools = llm.bind_tools(tools)
+# "agent": the model decides to call the retriever (two LLM calls).
+# "single_shot": retrieve on the question, then one structured LLM call.
+GRAPH_MODES = ("agent", "single_shot")
+if GRAPH_MODE not in GRAPH_MODES:
+    raise ValueError(f"Unknown GRAPH_MODE {GRAPH_MODE!r}, expected one of {list(GRAPH_MODES)}")
+
+# The chat model, the compiled graphs and the answer cache are built on first use: importing
+# langchain_openai and langgraph alone takes seconds, which every cold start of the UI would pay.
+_llm = None
+_agent_apps: dict = {}
+_semantic_cache = None
+_resources_lock = threading.Lock()
+
+
+def get_llm():
+    """Return the process-wide `ChatOpenAI` client."""
+    global _llm
+    if _llm is None:
+        with _resources_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+
+                # stream_usage keeps token counts in the metrics when the UI streams the answer.
+                _llm = ChatOpenAI(model=MODEL, temperature=0, stream_usage=True)
+    return _llm
 
 
-def call_model(state: AgentState):
+def _prepare_messages(state: AgentState) -> list:
     messages = list(state["messages"])
     
     # Add system prompt if not present
     if not any(isinstance(msg, SystemMessage) for msg in messages):
         messages = [SystemMessage(content=text2sql_prompt)] + messages
-    
-    # Check if tool was already called
-    tool_called = state.get("tool_called", False)
-    
-    if tool_called:
-        # Generate final SQL response without tools
-        response = llm.invoke(messages)
-    else:
-        # First call: allow tool usage
-        response = llm_with_tools.invoke(messages)
-    
-    return {"messages": [response]}
+    return messages
 
 
 def should_continue(state: AgentState):
@@ -69,27 +96,461 @@ def mark_tool_called(state: AgentState):
     return {"tool_called": True}
 
 
-# Build the graph
-workflow = StateGraph(AgentState)
+def build_agent(chat_model, agent_tools: list | None = None):
+    """
+    Build and compile the text2sql graph around `chat_model`.
+
+    The `agent` node has both a sync and an async implementation, so the compiled
+    graph supports `invoke`/`stream` as well as `ainvoke`/`astream`; on the async
+    path the LLM calls, the retriever tool and its embedding request are awaited
+    instead of blocking a thread.
+
+    Args:
+        chat_model: Chat model used for both the tool-calling and the final call.
+        agent_tools: Tools offered on the first call. Defaults to `tools`.
+
+    Returns:
+        The compiled LangGraph application.
+    """
+    from langgraph.graph import StateGraph
+    from langgraph.prebuilt import ToolNode
+
+    agent_tools = agent_tools or tools
+    chat_model_with_tools = chat_model.bind_tools(agent_tools)
+
+    def call_model(state: AgentState):
+        messages = _prepare_messages(state)
+        
+        if state.get("tool_called", False):
+            # Generate final SQL response without tools
+            response = chat_model.invoke(messages)
+        else:
+            # First call: allow tool usage
+            response = chat_model_with_tools.invoke(messages)
+        
+        return {"messages": [response]}
+
+    async def acall_model(state: AgentState):
+        messages = _prepare_messages(state)
+
+        if state.get("tool_called", False):
+            response = await chat_model.ainvoke(messages)
+        else:
+            response = await chat_model_with_tools.ainvoke(messages)
+
+        return {"messages": [response]}
+
+    # Build the graph
+    workflow = StateGraph(AgentState)
+
+    workflow.add_node("agent", RunnableLambda(call_model, afunc=acall_model, name="call_model"))
+    workflow.add_node("tools", ToolNode(agent_tools))
+    workflow.add_node("mark_called", mark_tool_called)
+
+    workflow.set_entry_point("agent")
+
+    workflow.add_conditional_edges(
+        "agent",
+        should_continue,
+        {
+            "tools": "tools",
+            END: END
+        }
+    )
+
+    # After tools execute, mark as called then return to agent
+    workflow.add_edge("tools", "mark_called")
+    workflow.add_edge("mark_called", "agent")
 
-workflow.add_node("agent", call_model)
-workflow.add_node("tools", ToolNode(tools))
-workflow.add_node("mark_called", mark_tool_called)
+    # Compile the graph
+    return workflow.compile()
 
-workflow.set_entry_point("agent")
 
-workflow.add_conditional_edges(
-    "agent",
-    should_continue,
-    {
-        "tools": "tools",
-        END: END
+def _structured_message(raw: AIMessage, parsed: SQLResponse | None) -> AIMessage:
+    """Final answer in the same shape as the tool-calling mode: SQLResponse JSON as content."""
+    content = parsed.model_dump_json() if parsed is not None else raw.content
+    return AIMessage(
+        content=content,
+        id=raw.id,
+        response_metadata=raw.response_metadata,
+        usage_metadata=raw.usage_metadata,
+    )
+
+
+def _retrieval_call(state: AgentState) -> dict:
+    question = next(m.content for m in reversed(state["messages"]) if isinstance(m, HumanMessage))
+    return {
+        "name": combined_retriever.name,
+        "args": {"user_query": question},
+        "id": f"call_{uuid.uuid4().hex}",
+        "type": "tool_call",
     }
-)
 
-# After tools execute, mark as called then return to agent
-workflow.add_edge("tools", "mark_called")
-workflow.add_edge("mark_called", "agent")
 
-# Compile the graph
-agent_app = workflow.compile()
\ No newline at end of file
+def build_single_shot_agent(chat_model, retriever=combined_retriever):
+    """
+    Build the "retrieve-then-generate" graph: one retrieval, one LLM call.
+
+    Retrieval runs directly on the user's question instead of asking the model
+    to request it, and the answer comes from a single structured-output call.
+    The resulting messages match the tool-calling graph (an AIMessage carrying
+    the tool call, the ToolMessage with its artifact, the final JSON answer),
+    so callers do not need to know which mode produced them.
+
+    Args:
+        chat_model: Chat model used for the generation call.
+        retriever: Tool run on the question before generation.
+
+    Returns:
+        The compiled LangGraph application.
+    """
+    from langgraph.graph import StateGraph
+
+    structured_model = chat_model.with_structured_output(SQLResponse, include_raw=True)
+
+    def retrieve(state: AgentState):
+        tool_call = _retrieval_call(state)
+        tool_message = retriever.invoke(tool_call)
+        return {"messages": [AIMessage(content="", tool_calls=[tool_call]), tool_message], "tool_called": True}
+
+    async def aretrieve(state: AgentState):
+        tool_call = _retrieval_call(state)
+        tool_message = await retriever.ainvoke(tool_call)
+        return {"messages": [AIMessage(content="", tool_calls=[tool_call]), tool_message], "tool_called": True}
+
+    def generate(state: AgentState):
+        result = structured_model.invoke(_prepare_messages(state))
+        return {"messages": [_structured_message(result["raw"], result["parsed"])]}
+
+    async def agenerate(state: AgentState):
+        result = await structured_model.ainvoke(_prepare_messages(state))
+        return {"messages": [_structured_message(result["raw"], result["parsed"])]}
+
+    workflow = StateGraph(AgentState)
+
+    workflow.add_node("retrieve", RunnableLambda(retrieve, afunc=aretrieve, name="retrieve"))
+    workflow.add_node("generate", RunnableLambda(generate, afunc=agenerate, name="generate"))
+
+    workflow.set_entry_point("retrieve")
+    workflow.add_edge("retrieve", "generate")
+    workflow.add_edge("generate", END)
+
+    return workflow.compile()
+
+
+def get_agent_app(mode: str | None = None):
+    """Return the compiled graph for `mode` (defaulting to GRAPH_MODE), compiling it on first use."""
+    mode = mode or GRAPH_MODE
+    if mode not in GRAPH_MODES:
+        raise ValueError(f"Unknown graph mode {mode!r}, expected one of {list(GRAPH_MODES)}")
+    app = _agent_apps.get(mode)
+    if app is None:
+        llm = get_llm()
+        with _resources_lock:
+            app = _agent_apps.get(mode)
+            if app is None:
+                app = build_agent(llm) if mode == "agent" else build_single_shot_agent(llm)
+                _agent_apps[mode] = app
+    return app
+
+
+def __getattr__(name: str):
+    # `agent_app` (the GRAPH_MODE graph) stays importable, but is only compiled when first accessed.
+    if name == "agent_app":
+        return get_agent_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_semantic_cache():
+    """Return the process-wide `SemanticCache` of answered questions."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        embeddings = get_embeddings()
+        with _resources_lock:
+            if _semantic_cache is None:
+                from src.semantic_cache import SemanticCache
+
+                _semantic_cache = SemanticCache(embeddings)
+    return _semantic_cache
+
+
+def _cache_version(database: str) -> str | None:
+    """
+    Version of the semantic cache entries for `database`: the schema snapshot
+    and vector index checksums the answers are produced with. None, and the
+    cache is skipped, when either is unavailable.
+    """
+    try:
+        # build_index publishes the three indexes together, so the combined one identifies the build.
+        checksums = (get_schema(database).checksum, index_checksum(VECTOR_DB_COMBINE))
+    except Exception as e:
+        logger.warning(f"Skipping the semantic cache, schema or index version unavailable: {e}")
+        return None
+    return hashlib.sha256("\x00".join(checksums).encode("utf-8")).hexdigest()[:16]
+
+
+def _cached_result(question: str, entry, similarity: float) -> dict:
+    """Rebuild an agent-shaped result from a semantic cache entry."""
+    response = SQLResponse(**entry.response)
+    return {
+        "messages": [HumanMessage(content=question), AIMessage(content=response.model_dump_json())],
+        "tool_called": True,
+        "retrieved_docs": entry.retrieved_docs,
+        "cache_hit": True,
+        "similarity": similarity,
+    }
+
+
+def _agent_result(result: dict) -> tuple[dict, SQLResponse | None]:
+    """Attach the retrieved documents to a graph result and parse its final answer."""
+    result = {**result, "retrieved_docs": tool_messages_to_documents(result["messages"]), "cache_hit": False}
+    try:
+        return result, parser.parse(result["messages"][-1].content)
+    except Exception as e:
+        logger.warning(f"Not caching unparseable answer: {e}")
+        return result, None
+
+
+def _check_query(response: SQLResponse | None, database: str) -> GuardResult | None:
+    if response is None or not QUERY_GUARD_ENABLED:
+        return None
+    return guard_query(response.sql_query, database)
+
+
+def _needs_rewrite(guard: GuardResult | None) -> bool:
+    return guard is not None and guard.verdict in ("limit", "reject")
+
+
+def _rewrite_input(result: dict, guard: GuardResult) -> dict:
+    """Continue the conversation with the plan estimate; the retrieved context is already in it."""
+    return {
+        "messages": list(result["messages"]) + [HumanMessage(content=rewrite_feedback(guard))],
+        "tool_called": True,
+    }
+
+
+def _attach_guard(result: dict, guard: GuardResult | None, request: dict) -> bool:
+    """Record the guard verdict on the result; returns whether the answer may be cached."""
+    if guard is None:
+        return True
+    result["guard"] = guard.to_dict()
+    request["guard"] = guard.verdict
+    return guard.verdict != "reject"
+
+
+def answer_question(question: str, database: str = "employees", bypass_cache: bool = not SEMANTIC_CACHE_ENABLED,
+                    mode: str | None = None) -> dict:
+    """
+    Answer `question` through the semantic cache, falling back to the agent graph.
+
+    Args:
+        question: The user's natural language question.
+        database: Namespace of the cache (one per database).
+        bypass_cache: Do not use the cache: always run the agent and do not store the answer.
+        mode: Graph mode ("agent" or "single_shot"). Defaults to GRAPH_MODE.
+
+    Returns:
+        dict: The agent state (`messages`, `tool_called`) plus `retrieved_docs`,
+            `cache_hit`, on a hit `similarity` and, when the guard ran, `guard`
+            (see `GuardResult.to_dict`).
+
+    When QUERY_GUARD_ENABLED, the generated SQL is checked with `guard_query`
+    before returning; "limit" and "reject" plans are sent back to the model for
+    a cheaper rewrite, up to QUERY_REWRITE_ATTEMPTS times. Rejected answers are
+    not cached.
+
+    Node timings and token usage are recorded in `src.metrics` under one request id.
+    """
+    mode = mode or GRAPH_MODE
+    with request_scope(question=question, database=database, mode=mode) as request:
+        version = None if bypass_cache else _cache_version(database)
+        if version is not None:
+            hit = get_semantic_cache().lookup(question, database, version)
+            if hit is not None:
+                request["cache_hit"] = True
+                return _cached_result(question, *hit)
+
+        started = time.perf_counter()
+        result = get_agent_app(mode).invoke(
+            {"messages": [HumanMessage(content=question)]},
+            config={"callbacks": [GraphMetricsHandler(mode)]},
+        )
+        result, response = _agent_result(result)
+
+        guard = _check_query(response, database)
+        for _ in range(QUERY_REWRITE_ATTEMPTS):
+            if not _needs_rewrite(guard):
+                break
+            # The "agent" graph with tool_called set makes one more LLM call without tools.
+            result = get_agent_app("agent").invoke(
+                _rewrite_input(result, guard), config={"callbacks": [GraphMetricsHandler("agent")]},
+            )
+            result, response = _agent_result(result)
+            guard = _check_query(response, database)
+            request["rewrites"] = request.get("rewrites", 0) + 1
+        latency = time.perf_counter() - started
+
+        if _attach_guard(result, guard, request) and response is not None and version is not None:
+            get_semantic_cache().store(
+                question, database, response.model_dump(), result["retrieved_docs"], latency, version
+            )
+        return result
+
+
+async def aanswer_question(question: str, database: str = "employees",
+                           bypass_cache: bool = not SEMANTIC_CACHE_ENABLED, mode: str | None = None) -> dict:
+    """
+    Async counterpart of `answer_question`, running the graph with `ainvoke`.
+    """
+    mode = mode or GRAPH_MODE
+    with request_scope(question=question, database=database, mode=mode) as request:
+        version = None if bypass_cache else await asyncio.to_thread(_cache_version, database)
+        if version is not None:
+            hit = await asyncio.to_thread(get_semantic_cache().lookup, question, database, version)
+            if hit is not None:
+                request["cache_hit"] = True
+                return _cached_result(question, *hit)
+
+        started = time.perf_counter()
+        result = await get_agent_app(mode).ainvoke(
+            {"messages": [HumanMessage(content=question)]},
+            config={"callbacks": [GraphMetricsHandler(mode)]},
+        )
+        result, response = _agent_result(result)
+
+        guard = await asyncio.to_thread(_check_query, response, database)
+        for _ in range(QUERY_REWRITE_ATTEMPTS):
+            if not _needs_rewrite(guard):
+                break
+            result = await get_agent_app("agent").ainvoke(
+                _rewrite_input(result, guard), config={"callbacks": [GraphMetricsHandler("agent")]},
+            )
+            result, response = _agent_result(result)
+            guard = await asyncio.to_thread(_check_query, response, database)
+            request["rewrites"] = request.get("rewrites", 0) + 1
+        latency = time.perf_counter() - started
+
+        if _attach_guard(result, guard, request) and response is not None and version is not None:
+            await asyncio.to_thread(
+                get_semantic_cache().store,
+                question, database, response.model_dump(), result["retrieved_docs"], latency, version,
+            )
+        return result
+
+
+def final_answer(result: dict) -> dict:
+    """
+    Parse the last message of a graph result with the agent's output parser.
+
+    The model may wrap the JSON in a code fence or prose. When it cannot be parsed,
+    the raw text is returned as the explanation and no SQL is run.
+    """
+    content = result["messages"][-1].content
+    try:
+        return parser.parse(content).model_dump()
+    except Exception as e:
+        logger.warning(f"Unparseable final answer: {e}")
+        return {"sql_query": None, "explanation": content}
+
+
+def partial_answer(text: str) -> dict | None:
+    """Fields of a `SQLResponse` JSON that is still being generated, e.g. {"sql_query": "SELECT d.de"}."""
+    try:
+        parsed = parse_json_markdown(text)
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) and parsed else None
+
+
+def _graph_events(app, graph_input: dict, mode: str):
+    """
+    Run a graph with `stream` and translate its output into UI events.
+
+    Yields:
+        tuple: ("status", node name) when a node starts, ("context", documents)
+            when retrieval returns, ("partial", dict) as the answer JSON grows,
+            and finally ("state", final graph state).
+    """
+    state = None
+    texts: dict[str, str] = {}
+    stream = app.stream(
+        graph_input,
+        config={"callbacks": [GraphMetricsHandler(mode)]},
+        stream_mode=["tasks", "messages", "values"],
+    )
+    for kind, payload in stream:
+        if kind == "values":
+            state = payload
+        elif kind == "tasks":
+            # Start events carry the node input, end events its result.
+            if "input" in payload:
+                yield "status", payload["name"]
+        else:
+            message, _ = payload
+            if isinstance(message, ToolMessage):
+                yield "context", tool_messages_to_documents([message])
+            elif isinstance(message, AIMessage) and message.text:
+                # Token chunks accumulate per message; a complete message replaces them.
+                key = message.id or ""
+                texts[key] = texts.get(key, "") + message.text if isinstance(message, AIMessageChunk) else message.text
+                partial = partial_answer(texts[key])
+                if partial:
+                    yield "partial", partial
+    yield "state", state
+
+
+def stream_answer(question: str, database: str = "employees", bypass_cache: bool = not SEMANTIC_CACHE_ENABLED,
+                  mode: str | None = None):
+    """
+    Streaming counterpart of `answer_question`, for showing progress while the graph runs.
+
+    The node currently running, the retrieved documents and the partially
+    generated SQL are reported as soon as they are known, so the first output
+    arrives after retrieval instead of after the whole chain.
+
+    Args:
+        question: The user's natural language question.
+        database: Namespace of the cache (one per database).
+        bypass_cache: Do not use the cache: always run the agent and do not store the answer.
+        mode: Graph mode ("agent" or "single_shot"). Defaults to GRAPH_MODE.
+
+    Yields:
+        tuple: ("status", node name), ("context", documents), ("partial", dict
+            of the `SQLResponse` fields generated so far) and, last,
+            ("result", dict) with what `answer_question` returns. A "status"
+            of "rewrite" marks the start of a query-guard rewrite.
+    """
+    mode = mode or GRAPH_MODE
+    with request_scope(question=question, database=database, mode=mode) as request:
+        version = None if bypass_cache else _cache_version(database)
+        if version is not None:
+            hit = get_semantic_cache().lookup(question, database, version)
+            if hit is not None:
+                request["cache_hit"] = True
+                yield "result", _cached_result(question, *hit)
+                return
+
+        started = time.perf_counter()
+        graph_input = {"messages": [HumanMessage(content=question)]}
+        graph = mode
+        for attempt in range(QUERY_REWRITE_ATTEMPTS + 1):
+            if attempt:
+                yield "status", "rewrite"
+                request["rewrites"] = attempt
+            for event, payload in _graph_events(get_agent_app(graph), graph_input, graph):
+                if event == "state":
+                    result, response = _agent_result(payload)
+                else:
+                    yield event, payload
+            guard = _check_query(response, database)
+            if not _needs_rewrite(guard):
+                break
+            # Rewrites run the "agent" graph, so their node metrics are labelled with it.
+            graph_input, graph = _rewrite_input(result, guard), "agent"
+        latency = time.perf_counter() - started
+
+        if _attach_guard(result, guard, request) and response is not None and version is not None:
+            get_semantic_cache().store(
+                question, database, response.model_dump(), result["retrieved_docs"], latency, version
+            )
+        yield "result", result
@@ -0,0 +1,214 @@
+"""
+Translate many questions to SQL in one run.
+
+    python -m src.batch questions.jsonl -o results.jsonl --concurrency 8 --rate 4 --execute
+
+Input is JSONL (one object per line with a `question` and optional `id`), a JSON
+list of such objects (e.g. `data/sample_queries/queries.json`) or a CSV with a
+`question` column. Results are appended to the output JSONL as they complete;
+re-running with the same output file skips items that already succeeded.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import time
+from pathlib import Path
+
+from config.logging_config import get_logger
+from config.settings import BATCH_CONCURRENCY, BATCH_RATE_LIMIT, SEMANTIC_CACHE_ENABLED
+from src.agents import aanswer_question, parser
+from src.sql import run_query_df_async
+
+logger = get_logger('src.batch')
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket limiting how many requests start per second.
+
+    Args:
+        rate: Requests per second. 0 or less disables limiting.
+        burst: Bucket size, i.e. how many requests may start back to back.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def load_questions(path) -> list[dict]:
+    """
+    Read questions from a JSONL, JSON or CSV file.
+
+    Returns:
+        list[dict]: Items with at least `id` and `question`; ids default to the 1-based position.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    elif path.suffix.lower() == ".json":
+        with path.open(encoding="utf-8") as f:
+            rows = json.load(f)
+    else:
+        with path.open(encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    for position, row in enumerate(rows, start=1):
+        if not row.get("question"):
+            logger.warning(f"Skipping row {position} without a question")
+            continue
+        items.append({**row, "id": str(row.get("id") or position)})
+    return items
+
+
+def completed_ids(output_path, retry_errors: bool = True) -> set[str]:
+    """Ids already present in `output_path`; failed items are excluded when `retry_errors`."""
+    done = set()
+    output_path = Path(output_path)
+    if not output_path.exists():
+        return done
+    with output_path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a truncated last line behind.
+                continue
+            if retry_errors and record.get("error"):
+                continue
+            done.add(str(record["id"]))
+    return done
+
+
+def token_usage(messages) -> dict:
+    """Sum `usage_metadata` over every LLM message of a run."""
+    usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    for message in messages:
+        metadata = getattr(message, "usage_metadata", None) or {}
+        for key in usage:
+            usage[key] += metadata.get(key, 0)
+    return usage
+
+
+async def translate_item(item: dict, database: str, execute: bool, bypass_cache: bool,
+                         mode: str | None = None) -> dict:
+    record = {"id": item["id"], "question": item["question"], "error": None}
+    if "sql" in item:
+        record["expected_sql"] = item["sql"]
+    started = time.perf_counter()
+    try:
+        result = await aanswer_question(item["question"], database, bypass_cache=bypass_cache, mode=mode)
+        record["agent_seconds"] = round(time.perf_counter() - started, 3)
+        record["cache_hit"] = result.get("cache_hit", False)
+        record["token_usage"] = token_usage(result["messages"])
+
+        response = parser.parse(result["messages"][-1].content)
+        record["sql_query"] = response.sql_query
+        record["explanation"] = response.explanation
+
+        guard = result.get("guard")
+        if guard is not None:
+            record["guard"] = {k: guard[k] for k in ("verdict", "reason", "rows_examined")}
+
+        if execute and guard is not None and guard["verdict"] == "reject":
+            record["error"] = f"QueryRejected: {guard['reason']}"
+        elif execute:
+            executed = time.perf_counter()
+            df = await run_query_df_async(guard["sql"] if guard else response.sql_query, database)
+            record["execute_seconds"] = round(time.perf_counter() - executed, 3)
+            record["row_count"] = len(df)
+    except Exception as e:
+        logger.error(f"Item {item['id']} failed: {e}")
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["total_seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+async def translate_batch(items: list[dict], output_path, database: str = "employees",
+                          concurrency: int = BATCH_CONCURRENCY, rate: float = BATCH_RATE_LIMIT,
+                          execute: bool = False, bypass_cache: bool = not SEMANTIC_CACHE_ENABLED,
+                          retry_errors: bool = True, mode: str | None = None) -> dict:
+    """
+    Translate `items` with bounded concurrency, appending one JSON line per item to `output_path`.
+
+    Returns:
+        dict: Summary with counts of processed, skipped and failed items and the wall time.
+    """
+    done = completed_ids(output_path, retry_errors)
+    pending = [item for item in items if item["id"] not in done]
+    logger.info(f"{len(pending)} item(s) to translate, {len(items) - len(pending)} already done")
+
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    limiter = AsyncRateLimiter(rate, burst=max(concurrency, 1))
+    failed = 0
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def run(item):
+            nonlocal failed
+            async with semaphore:
+                await limiter.acquire()
+                record = await translate_item(item, database, execute, bypass_cache, mode)
+            failed += record["error"] is not None
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+
+        await asyncio.gather(*(run(item) for item in pending))
+
+    return {
+        "total": len(items),
+        "skipped": len(items) - len(pending),
+        "processed": len(pending),
+        "failed": failed,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("input", help="JSONL, JSON or CSV file of questions")
+    arg_parser.add_argument("-o", "--output", required=True, help="JSONL file to append results to")
+    arg_parser.add_argument("--database", default="employees")
+    arg_parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    arg_parser.add_argument("--rate", type=float, default=BATCH_RATE_LIMIT, help="max questions started per second (0 = unlimited)")
+    arg_parser.add_argument("--execute", action="store_true", help="also run the generated SQL")
+    arg_parser.add_argument("--no-cache", action="store_true", help="bypass the semantic answer cache")
+    arg_parser.add_argument("--mode", choices=("agent", "single_shot"), default=None, help="graph mode (default: GRAPH_MODE)")
+    arg_parser.add_argument("--keep-errors", action="store_true", help="do not retry items that failed in a previous run")
+    args = arg_parser.parse_args(argv)
+
+    summary = asyncio.run(translate_batch(
+        load_questions(args.input),
+        args.output,
+        database=args.database,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        execute=args.execute,
+        bypass_cache=args.no_cache or not SEMANTIC_CACHE_ENABLED,
+        retry_errors=not args.keep_errors,
+        mode=args.mode,
+    ))
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
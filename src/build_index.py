@@ -0,0 +1,260 @@
+"""
+Build the FAISS indexes under `vector_db/` from `data/`.
+
+    python -m src.build_index            # incremental: embed only new/changed documents
+    python -m src.build_index --force    # re-embed everything
+    python -m src.build_index --dry-run  # report what would change
+
+Indexes are written in the pickle-free, memory-mapped format of
+`src.mmap_store` unless `--format faiss` asks for the LangChain FAISS layout.
+Vectors of unchanged documents are reused from the current indexes (matched by
+content hash), new or edited documents are embedded in batched requests, and
+deleted ones simply drop out. All three indexes are written to one new
+directory under `vector_db/builds/`, then `vector_db/manifest.json` is
+replaced in a single rename: it names that build (the app switches all three
+indexes when it changes) and records the hashes, token counts and build
+timings. The previous build is kept for readers still using it; older ones
+are deleted.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from langchain_community.vectorstores import FAISS
+
+from config.logging_config import get_logger
+from config.settings import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    VECTOR_DB_DIR_TABLES,
+    VECTOR_DB_DIR_SAMPLEQ,
+    VECTOR_DB_COMBINE,
+    VECTOR_DB_MANIFEST,
+    VECTOR_DB_BUILDS_DIR,
+    VECTOR_STORE_FORMAT,
+)
+from src.documents import load_table_documents, load_sample_query_documents
+from src.embeddings import get_embeddings
+from src.mmap_store import MmapVectorStore, is_mmap_store, write_mmap_store
+from src.utils import count_tokens
+from src.vector_store import current_build, index_path
+
+logger = get_logger('src.build_index')
+
+# Builds kept on disk: the current one and the one before it, which a process may still be reading.
+KEEP_BUILDS = 2
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def document_id(doc) -> str:
+    """Stable id of a source document, independent of its content: the file, plus the position for sample queries."""
+    if doc.metadata["type"] == "sample-queries":
+        return f"{doc.metadata['source']}#{doc.metadata['index']}"
+    return doc.metadata["source"]
+
+
+def existing_vectors(paths) -> dict[str, list[float]]:
+    """Content hash -> vector for every document in the indexes saved at `paths`."""
+    vectors = {}
+    for path in paths:
+        if is_mmap_store(path):
+            store = MmapVectorStore(path, get_embeddings())
+            for position in range(store.ntotal):
+                vectors.setdefault(content_hash(store.document(position).page_content), store.vectors[position].tolist())
+            continue
+        if not (Path(path) / "index.faiss").exists():
+            continue
+        # These are our own build outputs, so unpickling the docstore is safe here.
+        store = FAISS.load_local(path, get_embeddings(), allow_dangerous_deserialization=True)
+        for position, docstore_id in store.index_to_docstore_id.items():
+            doc = store.docstore.search(docstore_id)
+            vectors.setdefault(content_hash(doc.page_content), store.index.reconstruct(position).tolist())
+    return vectors
+
+
+def embed_missing(texts: dict[str, str], batch_size: int = EMBEDDING_BATCH_SIZE) -> tuple[dict, int]:
+    """Embed `texts` (hash -> text) in batches; returns (hash -> vector, number of requests)."""
+    embeddings = get_embeddings()
+    hashes = list(texts)
+    vectors = {}
+    calls = 0
+    for start in range(0, len(hashes), batch_size):
+        batch = hashes[start:start + batch_size]
+        for key, vector in zip(batch, embeddings.embed_documents([texts[h] for h in batch])):
+            vectors[key] = vector
+        calls += 1
+    return vectors, calls
+
+
+def write_index(path, docs, vectors: dict[str, list[float]], fmt: str = VECTOR_STORE_FORMAT):
+    """Write an index of `docs` in format `fmt` ("mmap" or "faiss") to the new directory `path`."""
+    doc_vectors = [vectors[content_hash(doc.page_content)] for doc in docs]
+    ids = [document_id(doc) for doc in docs]
+    if fmt == "mmap":
+        write_mmap_store(path, docs, doc_vectors, ids)
+    elif fmt == "faiss":
+        store = FAISS.from_embeddings(
+            text_embeddings=[(doc.page_content, vector) for doc, vector in zip(docs, doc_vectors)],
+            embedding=get_embeddings(),
+            metadatas=[doc.metadata for doc in docs],
+            ids=ids,
+        )
+        store.save_local(path)
+    else:
+        raise ValueError(f"Unknown vector store format {fmt!r}")
+
+
+def write_build(indexes: dict, vectors: dict[str, list[float]], fmt: str = VECTOR_STORE_FORMAT) -> Path:
+    """
+    Write every index of `indexes` (index path -> documents) into one new build
+    directory under VECTOR_DB_BUILDS_DIR. Nothing reads it until the manifest
+    points to it.
+    """
+    build = Path(VECTOR_DB_BUILDS_DIR) / datetime.now(timezone.utc).strftime(f"%Y%m%dT%H%M%S%f-{os.getpid()}")
+    staging = build.with_name(f"{build.name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    for path, docs in indexes.items():
+        write_index(index_path(path, staging), docs, vectors, fmt)
+    staging.rename(build)
+    return build
+
+
+def prune_builds(current: Path, keep: int = KEEP_BUILDS):
+    """Delete all but the `keep` newest builds (never `current`), and staging directories left by failed runs."""
+    builds = sorted(p for p in Path(VECTOR_DB_BUILDS_DIR).iterdir() if p.is_dir() and p != current)
+    finished = [p for p in builds if p.suffix != ".tmp"]
+    for path in [p for p in builds if p.suffix == ".tmp"] + finished[:max(len(finished) - keep + 1, 0)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def load_manifest(path=VECTOR_DB_MANIFEST) -> dict:
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build(force: bool = False, dry_run: bool = False, fmt: str = VECTOR_STORE_FORMAT) -> dict:
+    """
+    Rebuild the tables, sample-query and combined indexes, embedding only what changed.
+
+    Returns:
+        dict: The manifest written (or that would be written, for a dry run).
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    tables_docs = load_table_documents()
+    sample_docs = load_sample_query_documents()
+    for doc in tables_docs + sample_docs:
+        doc.metadata["token_count"] = count_tokens(doc.page_content)
+    timings["load_seconds"] = time.perf_counter() - started
+
+    step = time.perf_counter()
+    previous_manifest = load_manifest()
+    previous_model = previous_manifest.get("embedding_model")
+    if not force and previous_model != EMBEDDING_MODEL:
+        # Vectors of another model do not live in the same space as the queries (and may differ in size).
+        logger.info(
+            f"Indexes were built with {previous_model or 'an unrecorded embedding model'}, "
+            f"re-embedding everything with {EMBEDDING_MODEL}"
+        )
+        force = True
+    build = current_build()
+    reusable = {} if force else existing_vectors(
+        [index_path(path, build) for path in (VECTOR_DB_DIR_TABLES, VECTOR_DB_DIR_SAMPLEQ, VECTOR_DB_COMBINE)]
+    )
+    wanted = {content_hash(doc.page_content): doc.page_content for doc in tables_docs + sample_docs}
+    missing = {h: text for h, text in wanted.items() if h not in reusable}
+    timings["reuse_seconds"] = time.perf_counter() - step
+
+    previous = previous_manifest.get("documents", {})
+    documents = {
+        document_id(doc): {
+            "hash": content_hash(doc.page_content),
+            "type": doc.metadata["type"],
+            "token_count": doc.metadata["token_count"],
+        }
+        for doc in tables_docs + sample_docs
+    }
+    changed = [doc_id for doc_id, info in documents.items() if previous.get(doc_id, {}).get("hash") != info["hash"]]
+    removed = sorted(set(previous) - set(documents))
+
+    manifest = {
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "embedding_model": EMBEDDING_MODEL,
+        "format": fmt,
+        "documents": documents,
+        "indexes": {
+            "tables": {"path": Path(VECTOR_DB_DIR_TABLES).name, "count": len(tables_docs)},
+            "sample_queries": {"path": Path(VECTOR_DB_DIR_SAMPLEQ).name, "count": len(sample_docs)},
+            "combined": {"path": Path(VECTOR_DB_COMBINE).name, "count": len(tables_docs) + len(sample_docs)},
+        },
+        "changed": changed,
+        "removed": removed,
+        "embedded": len(missing),
+        "reused": len(wanted) - len(missing),
+        "total_tokens": sum(info["token_count"] for info in documents.values()),
+    }
+    if dry_run:
+        manifest["timings"] = {k: round(v, 3) for k, v in timings.items()}
+        return manifest
+
+    step = time.perf_counter()
+    vectors, calls = embed_missing(missing)
+    vectors.update({h: reusable[h] for h in wanted if h in reusable})
+    manifest["embedding_calls"] = calls
+    timings["embed_seconds"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    build = write_build({
+        VECTOR_DB_DIR_TABLES: tables_docs,
+        VECTOR_DB_DIR_SAMPLEQ: sample_docs,
+        VECTOR_DB_COMBINE: tables_docs + sample_docs,
+    }, vectors, fmt)
+    manifest["build"] = build.relative_to(Path(VECTOR_DB_MANIFEST).parent).as_posix()
+    for info in manifest["indexes"].values():
+        info["path"] = f"{manifest['build']}/{info['path']}"
+    timings["write_seconds"] = time.perf_counter() - step
+    timings["total_seconds"] = time.perf_counter() - started
+    manifest["timings"] = {k: round(v, 3) for k, v in timings.items()}
+
+    tmp = Path(f"{VECTOR_DB_MANIFEST}.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, VECTOR_DB_MANIFEST)
+    prune_builds(build)
+    logger.info(
+        f"Built indexes: {manifest['embedded']} embedded in {calls} request(s), "
+        f"{manifest['reused']} reused, {len(removed)} removed"
+    )
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="re-embed every document")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    parser.add_argument("--format", choices=("mmap", "faiss"), default=VECTOR_STORE_FORMAT,
+                        help="on-disk index format (default: VECTOR_STORE_FORMAT)")
+    args = parser.parse_args(argv)
+
+    manifest = build(force=args.force, dry_run=args.dry_run, fmt=args.format)
+    summary = {k: manifest[k] for k in ("changed", "removed", "embedded", "reused") if k in manifest}
+    summary["embedding_calls"] = manifest.get("embedding_calls", 0)
+    summary["timings"] = manifest["timings"]
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
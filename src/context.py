@@ -0,0 +1,89 @@
+import re
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+
+from config.logging_config import get_logger
+from config.settings import CONTEXT_TOKEN_BUDGET
+from src.retrieval import document_key
+from src.utils import count_tokens
+
+logger = get_logger('src.context')
+
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_MARKDOWN_EMPHASIS = re.compile(r"\*\*|__")
+
+
+@dataclass
+class PackedContext:
+    """Text sent to the model for a set of retrieved documents, with what packing it cost or saved."""
+    text: str
+    tokens: int
+    raw_tokens: int
+    included: int
+    dropped: int
+    duplicates: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.raw_tokens - self.tokens
+
+
+def _compact_lines(text: str) -> str:
+    return "\n".join(line.rstrip() for line in text.strip().splitlines() if line.strip())
+
+
+def render_document(doc: Document) -> str:
+    """Compact text for one document: question + SQL for sample queries, trimmed markdown otherwise."""
+    if doc.metadata.get("sql"):
+        return f"Q: {' '.join(doc.page_content.split())}\nSQL: {_compact_lines(doc.metadata['sql'])}"
+    return _compact_lines(_MARKDOWN_EMPHASIS.sub("", _BLANK_LINES.sub("\n", doc.page_content)))
+
+
+def pack_context(results: list[Document], budget: int = CONTEXT_TOKEN_BUDGET, header: str = "") -> PackedContext:
+    """
+    Pack retrieved documents into at most `budget` tokens of model context.
+
+    Duplicates are dropped (the same table, or sample queries with the same
+    normalized SQL), metadata such as ids, sources and scores is left out, and
+    the remaining documents are added greedily in relevance order (the order of
+    `results`), skipping any that no longer fit.
+
+    Args:
+        results: Retrieved documents, most relevant first.
+        budget: Maximum number of tokens of the packed text. 0 or less means no limit.
+        header: Text placed first and always kept, e.g. the schema block.
+
+    Returns:
+        PackedContext: The packed text and its token accounting against `str(results)`.
+    """
+    seen = set()
+    unique = []
+    for doc in results:
+        key = document_key(doc)
+        if key not in seen:
+            seen.add(key)
+            unique.append(doc)
+
+    parts = [header] if header else []
+    used = count_tokens(header) if header else 0
+    included = 0
+    for doc in unique:
+        rendered = render_document(doc)
+        # Each part after the first also costs its "\n\n" separator (about one token).
+        cost = count_tokens(rendered) + (1 if parts else 0)
+        if budget > 0 and used + cost > budget:
+            continue
+        parts.append(rendered)
+        used += cost
+        included += 1
+
+    text = "\n\n".join(parts)
+    return PackedContext(
+        text=text,
+        tokens=count_tokens(text),
+        raw_tokens=count_tokens(str(results)),
+        included=included,
+        dropped=len(unique) - included,
+        duplicates=len(results) - len(unique),
+    )
@@ -0,0 +1,114 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from config.logging_config import get_logger
+from config.settings import RESULT_ARROW_DTYPES, RESULT_DICTIONARY_RATIO
+
+logger = get_logger('src.dataframes')
+
+# Integer columns are narrowed to the first of these that holds their range. int8 is left out so
+# sums and differences of small counts keep some headroom.
+_INT_TYPES = (pa.int16(), pa.int32())
+# Smaller results (e.g. one page) are not dictionary-encoded: building the Categoricals costs more than it saves.
+DICTIONARY_MIN_ROWS = 10_000
+
+
+def _column_array(values) -> pa.Array:
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite columns can mix Python types; keep such a column as text.
+        return pa.array([None if value is None else str(value) for value in values], pa.string())
+
+
+def rows_to_table(columns: list[str], rows: list) -> pa.Table:
+    """Arrow table of fetched rows, converted column by column without an object-dtype DataFrame in between."""
+    if not rows:
+        return pa.Table.from_arrays([pa.array([], pa.null()) for _ in columns], names=columns)
+    return pa.Table.from_arrays([_column_array(values) for values in zip(*rows)], names=columns)
+
+
+def concat_tables(tables: list[pa.Table]) -> pa.Table:
+    """
+    Concatenate per-batch tables of one result. A column whose type was
+    inferred differently in some batch (e.g. all-NULL, or mixed SQLite values)
+    is widened, or falls back to text.
+    """
+    try:
+        return pa.concat_tables(tables, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        text = {
+            name for name in tables[0].column_names
+            if len({t.schema.field(name).type for t in tables} - {pa.null()}) > 1
+        }
+        logger.debug(f"Columns {sorted(text)} have mixed types, returning them as text")
+        tables = [
+            t.cast(pa.schema([pa.field(f.name, pa.string() if f.name in text else f.type) for f in t.schema]))
+            for t in tables
+        ]
+        return pa.concat_tables(tables, promote_options="permissive")
+
+
+def _downcast(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    if not pa.types.is_signed_integer(column.type) or column.null_count == len(column):
+        return column
+    bounds = pc.min_max(column)
+    low, high = bounds["min"].as_py(), bounds["max"].as_py()
+    for target in _INT_TYPES:
+        if target.bit_width >= column.type.bit_width:
+            break
+        limit = 1 << (target.bit_width - 1)
+        if -limit <= low and high < limit:
+            return column.cast(target)
+    return column
+
+
+def _dictionary_encode(column: pa.ChunkedArray, ratio: float) -> pa.ChunkedArray:
+    if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+        return column
+    if pc.count_distinct(column).as_py() > len(column) * ratio:
+        return column
+    return column.dictionary_encode()
+
+
+def compact_table(table: pa.Table, dictionary_ratio: float = RESULT_DICTIONARY_RATIO) -> pa.Table:
+    """
+    Shrink a result table: downcast integer columns to the narrowest type that
+    holds their values and dictionary-encode text columns whose distinct values
+    are at most `dictionary_ratio` of their rows (e.g. gender, dept_name, title)
+    once the table has DICTIONARY_MIN_ROWS rows.
+    """
+    columns = [_downcast(column) for column in table.columns]
+    if table.num_rows >= DICTIONARY_MIN_ROWS:
+        columns = [_dictionary_encode(column, dictionary_ratio) for column in columns]
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def _pandas_type(arrow_type: pa.DataType):
+    # Dictionary columns become Categoricals (integer codes plus one copy of each value).
+    return None if pa.types.is_dictionary(arrow_type) else pd.ArrowDtype(arrow_type)
+
+
+def table_to_dataframe(table: pa.Table) -> pd.DataFrame:
+    """
+    DataFrame over `table`. With RESULT_ARROW_DTYPES the columns stay in Arrow
+    memory (`pd.ArrowDtype`), so no values are copied; otherwise the usual
+    NumPy/object dtypes.
+    """
+    if not RESULT_ARROW_DTYPES:
+        return table.to_pandas()
+    return table.to_pandas(types_mapper=_pandas_type)
+
+
+def result_dataframe(table: pa.Table) -> pd.DataFrame:
+    """DataFrame of a complete result, compacted (see `compact_table`) when RESULT_ARROW_DTYPES is set."""
+    return table_to_dataframe(compact_table(table) if RESULT_ARROW_DTYPES else table)
+
+
+def dataframe_to_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Arrow table for `st.dataframe` and friends. Arrow-backed and categorical
+    columns are handed over without copying their values.
+    """
+    return pa.Table.from_pandas(df, preserve_index=False)
@@ -0,0 +1,56 @@
+import json
+import re
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from config.settings import INPUT_DATA_TABLES_DIR, INPUT_DATA_SAMPLE_DIR
+
+_TABLE_NAME = re.compile(r"^##\s*Table Name:\s*`?([\w.]+)`?", re.MULTILINE)
+
+
+def table_name(doc: Document) -> str | None:
+    """
+    Table a "tables-info" document describes, read from its "## Table Name"
+    heading. Indexes built before the heading was parsed carry the file name
+    (e.g. `dep_emp`) in `metadata["table_name"]`; that is only the fallback.
+    """
+    match = _TABLE_NAME.search(doc.page_content)
+    return match.group(1) if match else doc.metadata.get("table_name")
+
+
+def load_table_documents(directory=INPUT_DATA_TABLES_DIR) -> list[Document]:
+    """
+    Load the table description markdown files.
+
+    `table_name` comes from the "## Table Name: `...`" heading (falling back to the
+    file name), so `dep_emp.md` maps to the real table `dept_emp`.
+    """
+    docs = []
+    for index, path in enumerate(sorted(Path(directory).glob("**/*.md")), start=101):
+        content = path.read_text(encoding="utf-8")
+        match = _TABLE_NAME.search(content)
+        docs.append(Document(
+            page_content=content,
+            metadata={
+                "source": path.relative_to(Path(directory).parent.parent).as_posix(),
+                "table_name": match.group(1) if match else path.stem,
+                "index": index,
+                "type": "tables-info",
+            },
+        ))
+    return docs
+
+
+def load_sample_query_documents(directory=INPUT_DATA_SAMPLE_DIR) -> list[Document]:
+    """Load the sample question/SQL pairs; the question is the content, the SQL is metadata."""
+    docs = []
+    for path in sorted(Path(directory).glob("*.json")):
+        with path.open(encoding="utf-8") as f:
+            samples = json.load(f)
+        for index, sample in enumerate(samples, start=1):
+            docs.append(Document(
+                page_content=sample["question"],
+                metadata={"sql": sample["sql"], "source": path.name, "index": index, "type": "sample-queries"},
+            ))
+    return docs
@@ -0,0 +1,125 @@
+import math
+import re
+import threading
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from config.logging_config import get_logger
+from config.settings import BM25_K1, BM25_B
+from src.documents import load_table_documents, load_sample_query_documents
+
+logger = get_logger('src.lexical')
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from get give how i in is it list me of on or show the their them "
+    "to was were what which who whose with all each per".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lower-case word tokens; snake_case identifiers also yield their parts,
+    so `dept_manager` matches both "dept_manager" and "manager".
+    """
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part and part not in _STOPWORDS)
+    return tokens
+
+
+def _document_text(doc: Document) -> str:
+    # Sample queries are matched on their SQL too: it names the tables and columns involved.
+    return f"{doc.page_content}\n{doc.metadata.get('sql', '')}"
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 inverted index over LangChain documents.
+
+    Building and searching are pure Python and need no network access; the
+    corpus here (table docs plus sample questions) indexes in well under a
+    millisecond per query.
+
+    Args:
+        documents: Documents to index.
+        k1: Term-frequency saturation.
+        b: Document-length normalization.
+    """
+
+    def __init__(self, documents: list[Document], k1: float = BM25_K1, b: float = BM25_B):
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        self.lengths = []
+        for doc_id, doc in enumerate(self.documents):
+            counts = Counter(tokenize(_document_text(doc)))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+        n = len(self.documents)
+        self.avg_length = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+        # idf of a term that appears in no document; used to normalize confidence.
+        self.max_idf = math.log(1 + (n + 0.5) / 0.5)
+
+    def search(self, query: str, k: int = 5) -> list[tuple[float, Document]]:
+        """Return up to `k` (score, document) pairs with a positive score, best first."""
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = 1 - self.b + self.b * self.lengths[doc_id] / self.avg_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self.documents[doc_id]) for doc_id, score in best]
+
+    def confidence(self, query: str, hits: list[tuple[float, Document]]) -> float:
+        """
+        How well the best hit covers the query, in [0, 1].
+
+        The top score is divided by the score a document would get if it contained
+        every query term once at average length; terms unknown to the index count
+        with the highest possible idf, so vague or out-of-vocabulary questions score low.
+        """
+        if not hits:
+            return 0.0
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        ceiling = sum(self.idf.get(term, self.max_idf) for term in terms)
+        return min(hits[0][0] / ceiling, 1.0) if ceiling else 0.0
+
+
+_lexical_index = None
+_lexical_lock = threading.Lock()
+
+
+def get_lexical_index() -> BM25Index:
+    """Return the process-wide BM25 index over table docs and sample questions, building it on first use."""
+    global _lexical_index
+    if _lexical_index is None:
+        with _lexical_lock:
+            if _lexical_index is None:
+                documents = load_table_documents() + load_sample_query_documents()
+                _lexical_index = BM25Index(documents)
+                logger.info(f"Built BM25 index over {len(documents)} document(s), {len(_lexical_index.postings)} term(s)")
+    return _lexical_index
+
+
+def rebuild_lexical_index():
+    """Drop the BM25 index so the next access rebuilds it from `data/`."""
+    global _lexical_index
+    with _lexical_lock:
+        _lexical_index = None
@@ -0,0 +1,375 @@
+"""
+In-process latency and token metrics.
+
+Histograms are kept in memory and rendered in the OpenMetrics text format,
+either to `METRICS_FILE` (rewritten after every request) or over HTTP when
+`METRICS_PORT` is set. Each request also gets an id and one JSON record in
+`REQUEST_LOG_FILE` with its node timings, token counts and row counts.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config.logging_config import get_logger
+from config.settings import METRICS_FILE, METRICS_PORT, REQUEST_LOG_FILE
+
+logger = get_logger('src.metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram with labels.
+
+    Args:
+        name: Metric name, e.g. "text2sql_node_seconds".
+        help: One-line description.
+        buckets: Upper bounds of the buckets, ascending; +Inf is added.
+        unit: OpenMetrics unit, e.g. "seconds".
+    """
+
+    def __init__(self, name: str, help: str, buckets, unit: str = ""):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.unit = unit
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [bucket counts..., +Inf count, sum]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# TYPE {self.name} histogram", f"# HELP {self.name} {self.help}"]
+        if self.unit:
+            lines.insert(1, f"# UNIT {self.name} {self.unit}")
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {values[-1]}")
+        return lines
+
+    def snapshot(self) -> dict:
+        """label tuple -> (count, sum), for tests and benchmarks."""
+        with self._lock:
+            return {key: (sum(values[:-1]), values[-1]) for key, values in self._series.items()}
+
+
+class Counter:
+    """
+    Thread-safe monotonic counter with labels.
+
+    Args:
+        name: Metric name without the `_total` suffix, e.g. "text2sql_queries_interrupted".
+        help: One-line description.
+    """
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._series: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# TYPE {self.name} counter", f"# HELP {self.name} {self.help}"]
+        with self._lock:
+            series = dict(self._series)
+        for key, value in sorted(series.items()):
+            lines.append(f"{self.name}_total{_format_labels(key)} {value}")
+        return lines
+
+    def snapshot(self) -> dict:
+        """label tuple -> value, for tests and benchmarks."""
+        with self._lock:
+            return dict(self._series)
+
+
+NODE_SECONDS = Histogram("text2sql_node_seconds", "Wall time of one graph node run.", LATENCY_BUCKETS, "seconds")
+LLM_TOKENS = Histogram("text2sql_llm_tokens", "Tokens per LLM call by kind (input, output, cached).", TOKEN_BUCKETS)
+RETRIEVER_SECONDS = Histogram("text2sql_retriever_seconds", "Wall time of one retriever call.", LATENCY_BUCKETS, "seconds")
+QUERY_SECONDS = Histogram("text2sql_query_seconds", "Wall time of one SQL query, including fetching.", LATENCY_BUCKETS, "seconds")
+QUERY_ROWS = Histogram("text2sql_query_rows", "Rows returned by one SQL query.", ROW_BUCKETS)
+REQUEST_SECONDS = Histogram("text2sql_request_seconds", "Wall time of one question, end to end.", LATENCY_BUCKETS, "seconds")
+
+QUERIES_INTERRUPTED = Counter("text2sql_queries_interrupted", "SQL queries stopped early, by reason (cancelled, timeout).")
+
+HISTOGRAMS = [NODE_SECONDS, LLM_TOKENS, RETRIEVER_SECONDS, QUERY_SECONDS, QUERY_ROWS, REQUEST_SECONDS]
+COUNTERS = [QUERIES_INTERRUPTED]
+
+
+def render_metrics() -> str:
+    """All histograms and counters in the OpenMetrics text format."""
+    lines = []
+    for metric in HISTOGRAMS + COUNTERS:
+        lines.extend(metric.render())
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path=METRICS_FILE):
+    """Replace `path` with the current metrics, through a temporary file unique to this call."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=f"{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(render_metrics())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+# Per-request record shared by everything that runs on behalf of one question,
+# including graph nodes executed in worker threads (LangChain copies the context).
+_current_request: contextvars.ContextVar[dict | None] = contextvars.ContextVar("text2sql_request", default=None)
+_request_log_lock = threading.Lock()
+
+
+def current_request() -> dict | None:
+    return _current_request.get()
+
+
+def _record(section: str, entry: dict):
+    request = _current_request.get()
+    if request is not None:
+        request.setdefault(section, []).append(entry)
+
+
+@contextmanager
+def request_scope(**fields):
+    """
+    Track one request: assigns a request id, collects timings and token counts
+    recorded while it runs and, when the outermost scope exits, writes one JSON
+    record to REQUEST_LOG_FILE and refreshes METRICS_FILE.
+
+    Nested scopes reuse the outer record and only add their `fields` to it.
+
+    Yields:
+        dict: The request record; callers may add fields to it.
+    """
+    request = _current_request.get()
+    if request is not None:
+        request.update(fields)
+        yield request
+        return
+
+    request = {"request_id": uuid.uuid4().hex, **fields}
+    token = _current_request.set(request)
+    started = time.perf_counter()
+    try:
+        yield request
+    except BaseException as e:
+        request["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_request.reset(token)
+        request["seconds"] = round(time.perf_counter() - started, 4)
+        REQUEST_SECONDS.observe(request["seconds"], mode=request.get("mode") or "default",
+                                cache_hit=str(bool(request.get("cache_hit"))).lower())
+        _finish_request(request)
+
+
+def _finish_request(request: dict):
+    try:
+        with _request_log_lock:
+            with open(REQUEST_LOG_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request, default=str) + "\n")
+            write_metrics_file()
+    except OSError as e:
+        logger.warning(f"Could not write request metrics: {e}")
+    logger.info(f"Request {request['request_id']} finished in {request['seconds']:.3f}s")
+
+
+def observe_query(seconds: float, rows: int, source: str):
+    """Record one SQL execution (`source` is "database" or "cache")."""
+    QUERY_SECONDS.observe(seconds, source=source)
+    QUERY_ROWS.observe(rows, source=source)
+    _record("queries", {"seconds": round(seconds, 4), "rows": rows, "source": source})
+
+
+def observe_interrupted(seconds: float, reason: str, dialect: str):
+    """Record a query stopped by the user ("cancelled") or by its deadline ("timeout")."""
+    QUERIES_INTERRUPTED.inc(reason=reason, dialect=dialect)
+    _record("queries", {"seconds": round(seconds, 4), "interrupted": reason})
+
+
+def timed_retriever(name: str):
+    """Decorator recording the wall time of a sync or async retriever function."""
+    def decorator(func):
+        def done(started):
+            seconds = time.perf_counter() - started
+            RETRIEVER_SECONDS.observe(seconds, retriever=name)
+            _record("retrievers", {"retriever": name, "seconds": round(seconds, 4)})
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    done(started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                done(started)
+        return wrapper
+    return decorator
+
+
+class GraphMetricsHandler(BaseCallbackHandler):
+    """
+    Callback handler timing every LangGraph node and recording LLM token usage.
+
+    Pass it in the run config (`{"callbacks": [handler]}`); it works for both
+    `invoke` and `ainvoke`. Node runs are recognised by the `langgraph_node`
+    metadata LangGraph attaches to the runnable executing each node.
+
+    Args:
+        graph: Label identifying the graph (e.g. the graph mode).
+    """
+
+    run_inline = True
+
+    def __init__(self, graph: str = "default"):
+        self.graph = graph
+        self._nodes: dict = {}
+        self._llm_nodes: dict = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node is None or kwargs.get("name") != node:
+            return
+        with self._lock:
+            # A node whose runnable carries the node's own name shows up twice; time the outer run.
+            parent = self._nodes.get(parent_run_id)
+            if parent is None or parent[0] != node:
+                self._nodes[run_id] = (node, time.perf_counter())
+
+    def _end_node(self, run_id, error: bool):
+        with self._lock:
+            started = self._nodes.pop(run_id, None)
+        if started is None:
+            return
+        node, start = started
+        seconds = time.perf_counter() - start
+        NODE_SECONDS.observe(seconds, graph=self.graph, node=node)
+        _record("nodes", {"node": node, "seconds": round(seconds, 4), **({"error": True} if error else {})})
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_node(run_id, error=False)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_node(run_id, error=True)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            self._llm_nodes[run_id] = (metadata or {}).get("langgraph_node", "unknown")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            node = self._llm_nodes.pop(run_id, "unknown")
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                tokens = {
+                    "input": usage.get("input_tokens", 0),
+                    "output": usage.get("output_tokens", 0),
+                    "cached": (usage.get("input_token_details") or {}).get("cache_read", 0),
+                }
+                for kind, count in tokens.items():
+                    LLM_TOKENS.observe(count, graph=self.graph, node=node, kind=kind)
+                _record("llm_calls", {"node": node, **tokens})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._llm_nodes.pop(run_id, None)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve `/metrics` on `port` from a daemon thread (once per process). 0 disables it."""
+    global _server
+    if port <= 0:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsRequestHandler)
+            except OSError as e:
+                # Another process (e.g. a second Streamlit worker) already serves this port.
+                logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"Serving metrics on http://0.0.0.0:{port}/metrics")
+    return _server
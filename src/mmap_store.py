@@ -0,0 +1,129 @@
+import asyncio
+import json
+import mmap
+import os
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+STORE_META = "store.json"
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.jsonl"
+OFFSETS_FILE = "offsets.npy"
+MMAP_FILES = (STORE_META, VECTORS_FILE, DOCS_FILE, OFFSETS_FILE)
+FORMAT_VERSION = "mmap-v1"
+
+
+def is_mmap_store(path) -> bool:
+    return (Path(path) / STORE_META).exists()
+
+
+def write_mmap_store(path, docs: list[Document], vectors, ids: list[str] | None = None):
+    """
+    Save `docs` and their `vectors` to `path` in the memory-mappable format.
+
+    The directory holds a float32 `vectors.npy`, one JSON document per line in
+    `docs.jsonl`, the byte offset of every line in `offsets.npy`, and
+    `store.json` describing the layout. Nothing is pickled.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(len(docs), -1))
+    np.save(path / VECTORS_FILE, matrix)
+
+    offsets = [0]
+    with (path / DOCS_FILE).open("wb") as f:
+        for position, doc in enumerate(docs):
+            record = {
+                "id": ids[position] if ids else doc.id,
+                "page_content": doc.page_content,
+                "metadata": doc.metadata,
+            }
+            offsets.append(offsets[-1] + f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"))
+    np.save(path / OFFSETS_FILE, np.asarray(offsets, dtype=np.int64))
+
+    with (path / STORE_META).open("w", encoding="utf-8") as f:
+        json.dump({"format": FORMAT_VERSION, "count": len(docs), "dim": int(matrix.shape[1]), "metric": "l2"}, f)
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Read-only vector store over files written by `write_mmap_store`.
+
+    Vectors and documents are memory-mapped rather than loaded, so opening a
+    store costs a few system calls, and worker processes on the same host share
+    the pages through the OS page cache. Searches run exact L2 k-NN with
+    `faiss.knn` directly on the mapped matrix; only the top-k documents are
+    decoded from `docs.jsonl`. Scores are squared L2 distances, as with the
+    LangChain FAISS store.
+
+    Args:
+        path: Directory written by `write_mmap_store`.
+        embedding: Embeddings used to embed queries.
+    """
+
+    def __init__(self, path, embedding):
+        self.path = Path(path)
+        self.embedding = embedding
+        with (self.path / STORE_META).open(encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector store format {self.meta.get('format')!r} in {self.path}")
+        self.vectors = np.load(self.path / VECTORS_FILE, mmap_mode="r")
+        self.offsets = np.load(self.path / OFFSETS_FILE, mmap_mode="r")
+        with (self.path / DOCS_FILE).open("rb") as f:
+            # mmap of an empty file is an error; an empty store has nothing to read anyway.
+            self._docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def document(self, position: int) -> Document:
+        """Decode the document stored at `position`."""
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        record = json.loads(self._docs[start:end])
+        return Document(page_content=record["page_content"], metadata=record["metadata"], id=record.get("id"))
+
+    def similarity_search_with_score_by_vector(self, embedding: list[float], k: int = 4,
+                                               **kwargs) -> list[tuple[Document, float]]:
+        import faiss
+
+        if self.ntotal == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        distances, positions = faiss.knn(query, self.vectors, min(k, self.ntotal))
+        return [
+            (self.document(int(position)), float(distance))
+            for distance, position in zip(distances[0], positions[0])
+            if position >= 0
+        ]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        embedding = await self.embedding.aembed_query(query)
+        return await asyncio.to_thread(self.similarity_search_by_vector, embedding, k, **kwargs)
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("MmapVectorStore is read-only; rebuild it with python -m src.build_index")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Build stores with write_mmap_store or python -m src.build_index")
@@ -0,0 +1,391 @@
+import datetime
+import decimal
+from dataclasses import dataclass, field
+
+import pandas as pd
+import sqlglot
+from sqlglot import exp
+
+from config.logging_config import get_logger
+from config.settings import QUERY_PAGE_SIZE
+from src.schema import get_schema
+from src.sql import get_engine, run_query_df
+
+logger = get_logger('src.paging')
+
+
+# Prefix of the columns added to a keyset query for sort columns it does not select.
+HIDDEN_KEY_PREFIX = "_page_key_"
+
+
+@dataclass
+class SortKey:
+    """One ORDER BY column usable for keyset pagination."""
+    column: exp.Column  # expression compared in the WHERE clause, e.g. `s.emp_no`
+    output: str  # name of the column in the result set
+    descending: bool = False
+    hidden: bool = False  # selected only for the cursor, dropped from the pages
+
+
+@dataclass
+class PagePlan:
+    """
+    How to fetch one query page by page.
+
+    `mode` is "keyset" (WHERE on the last row's sort key, same cost for every
+    page), "offset" (LIMIT/OFFSET, for queries without a unique sort key),
+    "wrap" (LIMIT/OFFSET around the query as a subquery, for set operations)
+    or "none" (statements that cannot be paged, run once).
+    """
+    mode: str
+    dialect: str
+    query: exp.Expression | None = None  # the query without its own LIMIT/OFFSET
+    keys: list[SortKey] = field(default_factory=list)
+    max_rows: int | None = None  # the query's own LIMIT
+    offset: int = 0  # the query's own OFFSET
+    sql: str = ""
+
+
+@dataclass
+class Page:
+    df: pd.DataFrame
+    number: int
+    first_row: int  # 0-based position of the page's first row in the whole result
+    has_next: bool
+
+
+def _from(select: exp.Select):
+    # sqlglot renamed the arg from "from" to "from_"
+    return select.args.get("from_") or select.args.get("from")
+
+
+def _int_literal(node) -> int | None:
+    value = node.args.get("expression") if node is not None else None
+    if isinstance(value, exp.Literal) and not value.is_string and value.this.isdigit():
+        return int(value.this)
+    return None
+
+
+def _tables(select: exp.Select) -> dict[str, str] | None:
+    """alias -> table name for the FROM/JOIN list, or None if it contains anything but tables."""
+    sources = [_from(select).this] if _from(select) else []
+    sources += [join.this for join in select.args.get("joins") or []]
+    tables = {}
+    for source in sources:
+        if not isinstance(source, exp.Table):
+            return None
+        tables[source.alias_or_name.lower()] = source.name.lower()
+    return tables
+
+
+def _resolve(column: exp.Column, tables: dict[str, str], schema_tables: dict) -> str | None:
+    """Alias of the table `column` belongs to."""
+    if column.table:
+        return column.table.lower() if column.table.lower() in tables else None
+    if len(tables) == 1:
+        return next(iter(tables))
+    owners = [alias for alias, table in tables.items()
+              if any(c["name"].lower() == column.name.lower() for c in schema_tables.get(table, []))]
+    return owners[0] if len(owners) == 1 else None
+
+
+def _output_name(select: exp.Select, column: exp.Column, alias: str, tables: dict[str, str],
+                 schema_tables: dict) -> str | None:
+    """Name under which `column` appears in the result, if it is selected exactly once."""
+    names = [p.alias_or_name.lower() for p in select.expressions]
+    for projection in select.expressions:
+        if isinstance(projection, exp.Star):
+            # With joins `*` may return the column more than once.
+            return column.name if len(tables) == 1 else None
+        inner = projection.unalias()
+        if isinstance(inner, exp.Column) and isinstance(inner.this, exp.Star):
+            if inner.table.lower() == alias:
+                return column.name
+            continue
+        if isinstance(inner, exp.Column) and inner.name.lower() == column.name.lower() \
+                and _resolve(inner, tables, schema_tables) == alias:
+            output = projection.alias_or_name
+            return output if names.count(output.lower()) == 1 else None
+    return None
+
+
+def _join_closure(select: exp.Select, covered: set, tables: dict[str, str], schema_tables: dict) -> set:
+    """`covered` plus every column an inner join's `a.x = b.y` condition makes equal to a covered one."""
+    pairs = []
+    for join in select.args.get("joins") or []:
+        if join.side or join.args.get("on") is None:
+            continue
+        for eq in join.args["on"].find_all(exp.EQ):
+            if isinstance(eq.this, exp.Column) and isinstance(eq.expression, exp.Column):
+                left = _resolve(eq.this, tables, schema_tables)
+                right = _resolve(eq.expression, tables, schema_tables)
+                if left and right:
+                    pairs.append(((left, eq.this.name.lower()), (right, eq.expression.name.lower())))
+    covered = set(covered)
+    changed = True
+    while changed:
+        changed = False
+        for a, b in pairs:
+            if (a in covered) != (b in covered):
+                covered |= {a, b}
+                changed = True
+    return covered
+
+
+def _sort_keys(select: exp.Select, schema_tables: dict) -> list[SortKey] | None:
+    """
+    The ORDER BY as keyset columns, if it orders the result uniquely.
+
+    Unique means the sort columns cover the GROUP BY columns or, without
+    grouping, the primary key of every table in the FROM/JOIN list. A query
+    over a single table without ORDER BY is given one on its primary key.
+    Sort columns the query does not select become hidden keys (see
+    `plan_pages`).
+    """
+    tables = _tables(select)
+    if not tables or select.args.get("distinct"):
+        return None
+    # Columns of outer-joined tables can be NULL whatever the schema says.
+    outer = {join.this.alias_or_name.lower() for join in select.args.get("joins") or [] if join.side}
+
+    order = select.args.get("order")
+    if order is None:
+        if len(tables) != 1 or select.args.get("group") or select.find(exp.AggFunc):
+            return None
+        (alias, table), = tables.items()
+        primary = [c["name"] for c in schema_tables.get(table, []) if c["primary"]]
+        if not primary:
+            return None
+        ordered = [exp.Ordered(this=exp.column(name, alias if alias != table else None)) for name in primary]
+    else:
+        ordered = order.expressions
+
+    aliases = {p.alias.lower(): p.this for p in select.expressions if isinstance(p, exp.Alias)}
+    keys, covered = [], set()
+    for item in ordered:
+        column = item.this
+        if isinstance(column, exp.Column) and not column.table and column.name.lower() in aliases:
+            output = column.name
+            column = aliases[column.name.lower()]
+        else:
+            output = None
+        if not isinstance(column, exp.Column):
+            return None
+        alias = _resolve(column, tables, schema_tables)
+        if alias is None or alias in outer:
+            return None
+        info = next((c for c in schema_tables.get(tables[alias], []) if c["name"].lower() == column.name.lower()), None)
+        # NULLs do not compare with > or <, so nullable columns cannot carry a keyset cursor.
+        if info is None or info["nullable"]:
+            return None
+        output = output or _output_name(select, column, alias, tables, schema_tables)
+        hidden = output is None
+        if hidden:
+            output = f"{HIDDEN_KEY_PREFIX}{len(keys)}"
+        keys.append(SortKey(column.copy(), output, bool(item.args.get("desc")), hidden))
+        covered.add((alias, column.name.lower()))
+
+    covered = _join_closure(select, covered, tables, schema_tables)
+    group = select.args.get("group")
+    if group is not None:
+        for expression in group.expressions:
+            if not isinstance(expression, exp.Column):
+                return None
+            alias = _resolve(expression, tables, schema_tables)
+            if alias is None or (alias, expression.name.lower()) not in covered:
+                return None
+        return keys
+    if select.find(exp.AggFunc):
+        return None
+    for alias, table in tables.items():
+        primary = {c["name"].lower() for c in schema_tables.get(table, []) if c["primary"]}
+        if not primary or not {(alias, name) for name in primary} <= covered:
+            return None
+    return keys
+
+
+def plan_pages(sql_query: str, dialect: str = "mysql", schema_tables: dict | None = None) -> PagePlan:
+    """
+    Parse `sql_query` and decide how to page through its result.
+
+    Args:
+        sql_query: The generated SQL.
+        dialect: sqlglot dialect of the database ("mysql" or "sqlite").
+        schema_tables: `SchemaSnapshot.tables`, used to find primary keys and nullable columns.
+
+    Returns:
+        PagePlan: The paging strategy; "none" when the statement is not a query
+            or cannot be parsed.
+    """
+    try:
+        tree = sqlglot.parse_one(sql_query.strip().rstrip(";"), read=dialect)
+    except sqlglot.errors.SqlglotError as e:
+        logger.warning(f"Not paging unparseable query: {e}")
+        return PagePlan("none", dialect, sql=sql_query)
+    if not isinstance(tree, exp.Query):
+        return PagePlan("none", dialect, sql=sql_query)
+    if not isinstance(tree, exp.Select):
+        return PagePlan("wrap", dialect, query=tree, sql=sql_query)
+
+    limit, offset = tree.args.get("limit"), tree.args.get("offset")
+    max_rows, skip = _int_literal(limit), _int_literal(offset)
+    if (limit is not None and max_rows is None) or (offset is not None and skip is None):
+        # LIMIT ? or an expression: keep the query intact and page around it.
+        return PagePlan("wrap", dialect, query=tree, sql=sql_query)
+    query = tree.copy()
+    query.set("limit", None)
+    query.set("offset", None)
+
+    keys = _sort_keys(query, schema_tables or {})
+    if keys and query.args.get("order") is None:
+        # nulls_first matches both dialects' default, so no NULLS clause is generated.
+        query = query.order_by(*(exp.Ordered(this=key.column.copy(), nulls_first=True) for key in keys))
+    hidden = [key for key in keys or [] if key.hidden]
+    if hidden:
+        # The cursor needs every sort column of the page's last row; these are dropped again in `QueryPager.page`.
+        query = query.select(*(exp.alias_(key.column.copy(), key.output) for key in hidden), append=True)
+    return PagePlan("keyset" if keys else "offset", dialect, query=query, keys=keys or [],
+                    max_rows=max_rows, offset=skip or 0, sql=sql_query)
+
+
+def cap_rows(sql_query: str, limit: int, dialect: str = "mysql") -> str:
+    """
+    `sql_query` returning at most `limit` rows: its own LIMIT is lowered (or
+    added) when it is a plain SELECT, other queries are wrapped in a subquery.
+    """
+    try:
+        tree = sqlglot.parse_one(sql_query.strip().rstrip(";"), read=dialect)
+    except sqlglot.errors.SqlglotError:
+        tree = None
+    if isinstance(tree, exp.Select):
+        current = _int_literal(tree.args.get("limit"))
+        if tree.args.get("limit") is None or (current is not None and current > limit):
+            return tree.limit(limit).sql(dialect=dialect)
+        if current is not None:
+            return tree.sql(dialect=dialect)
+    if isinstance(tree, exp.Query):
+        return exp.select("*").from_(tree.subquery("limited_result")).limit(limit).sql(dialect=dialect)
+    return f"SELECT * FROM ({sql_query.strip().rstrip(';')}) AS limited_result LIMIT {int(limit)}"
+
+
+def _literal(value) -> exp.Expression:
+    if hasattr(value, "item"):  # numpy scalar
+        value = value.item()
+    if isinstance(value, bool):
+        return exp.Boolean(this=value)
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return exp.Literal.number(str(value))
+    if isinstance(value, (datetime.datetime, pd.Timestamp)):
+        return exp.Literal.string(value.isoformat(sep=" "))
+    if isinstance(value, datetime.date):
+        return exp.Literal.string(value.isoformat())
+    return exp.Literal.string(str(value))
+
+
+def keyset_condition(keys: list[SortKey], after: tuple) -> exp.Expression:
+    """Rows sorting after `after`: `k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...` (< for DESC keys)."""
+    terms = []
+    for i, key in enumerate(keys):
+        compare = exp.LT if key.descending else exp.GT
+        parts = [exp.EQ(this=k.column.copy(), expression=_literal(v)) for k, v in zip(keys[:i], after)]
+        parts.append(compare(this=key.column.copy(), expression=_literal(after[i])))
+        terms.append(exp.and_(*parts))
+    return exp.or_(*terms)
+
+
+def page_sql(plan: PagePlan, limit: int, offset: int = 0, after: tuple | None = None) -> str:
+    """
+    SQL for one page of at most `limit` rows.
+
+    Keyset plans continue after the sort key `after` (None for the first page);
+    the others skip `offset` rows.
+    """
+    if plan.mode == "none":
+        return plan.sql
+    if plan.mode == "wrap":
+        query = exp.select("*").from_(plan.query.subquery("paged_result", copy=True))
+    else:
+        query = plan.query
+    if plan.mode == "keyset" and after is not None:
+        query = query.where(keyset_condition(plan.keys, after))
+        offset = 0
+    elif plan.mode != "wrap":
+        offset += plan.offset
+    query = query.limit(limit)
+    if offset:
+        query = query.offset(offset)
+    return query.sql(dialect=plan.dialect)
+
+
+class QueryPager:
+    """
+    Page through the result of `sql_query`, fetching one page per request.
+
+    Every request asks for `page_size` + 1 rows (the extra row only tells
+    whether a next page exists), and never more than the query's own LIMIT
+    allows. Keyset plans remember the sort key of each page's last row, so
+    page 500 costs the same index range scan as page 1; other plans fall back
+    to LIMIT/OFFSET. Sort columns the query does not select are fetched as
+    hidden `_page_key_N` columns for the cursor and removed from the pages.
+
+    Args:
+        sql_query: The SQL to page through.
+        database: Database to run it against.
+        page_size: Rows per page.
+    """
+
+    def __init__(self, sql_query: str, database: str = "employees", page_size: int = QUERY_PAGE_SIZE):
+        self.database = database
+        self.page_size = page_size
+        dialect = get_engine(database).dialect.name
+        try:
+            schema_tables = get_schema(database).tables
+        except Exception as e:
+            logger.warning(f"No schema for keyset pagination, using offsets: {e}")
+            schema_tables = {}
+        schema_tables = {name.lower(): columns for name, columns in schema_tables.items()}
+        self.plan = plan_pages(sql_query, dialect, schema_tables)
+        # Sort key of the last row of each page fetched so far (keyset plans).
+        self._cursors: list[tuple | None] = [None]
+        logger.info(f"Paging with {self.plan.mode} plan")
+
+    @property
+    def mode(self) -> str:
+        return self.plan.mode
+
+    def page(self, number: int = 0) -> Page:
+        """
+        Fetch page `number` (0-based). Keyset plans can only move one page past
+        the furthest page fetched so far.
+        """
+        first_row = number * self.page_size
+        if self.plan.mode == "none":
+            df = run_query_df(self.plan.sql, self.database) if number == 0 else pd.DataFrame()
+            return Page(df, number, 0, False)
+
+        limit = self.page_size
+        if self.plan.max_rows is not None:
+            limit = max(min(limit, self.plan.max_rows - first_row), 0)
+        if limit == 0:
+            return Page(pd.DataFrame(), number, first_row, False)
+
+        if self.plan.mode == "keyset":
+            if number >= len(self._cursors):
+                raise IndexError(f"Page {number} requested before page {len(self._cursors) - 1}")
+            after = self._cursors[number]
+            sql = page_sql(self.plan, limit + 1, after=after)
+        else:
+            sql = page_sql(self.plan, limit + 1, offset=first_row)
+
+        df = run_query_df(sql, self.database)
+        has_next = len(df) > limit
+        df = df.iloc[:limit]
+        if self.plan.max_rows is not None and first_row + len(df) >= self.plan.max_rows:
+            has_next = False
+        if self.plan.mode == "keyset" and has_next and number + 1 == len(self._cursors):
+            last = df.iloc[-1]
+            self._cursors.append(tuple(last[key.output] for key in self.plan.keys))
+        hidden = [key.output for key in self.plan.keys if key.hidden]
+        if hidden:
+            df = df.drop(columns=hidden)
+        return Page(df.reset_index(drop=True), number, first_row, has_next)
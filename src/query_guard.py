@@ -0,0 +1,324 @@
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+import sqlglot
+from sqlglot import exp
+
+from config.logging_config import get_logger
+from config.settings import (
+    QUERY_WARN_ROWS,
+    QUERY_LIMIT_ROWS,
+    QUERY_REJECT_ROWS,
+    QUERY_AUTO_LIMIT,
+    SCHEMA_REFRESH_INTERVAL,
+)
+from src.paging import cap_rows
+from src.result_cache import normalize_sql
+from src.sql import get_engine
+
+logger = get_logger('src.query_guard')
+
+VERDICTS = ("run", "warn", "limit", "reject")
+
+# Rows assumed per outer row for an index SEARCH when neither sqlite_stat1 nor a unique index says otherwise.
+SQLITE_SEARCH_FANOUT = 10
+
+_SQLITE_STEP = re.compile(r"^(SCAN|SEARCH)\s+(?:TABLE\s+)?(\S+)(?:\s+AS\s+(\S+))?")
+_SQLITE_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\S+) \(([^)]*)\)")
+# Nodes that write data, change the schema or the session, wherever they appear in a statement.
+_WRITE_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop, exp.Alter, exp.TruncateTable,
+    exp.Command, exp.Set, exp.Grant, exp.Use, exp.Transaction, exp.Commit, exp.Rollback, exp.Pragma,
+    exp.LoadData, exp.Kill,
+)
+_TABLE_ALIAS = re.compile(r"\b(?:from|join|,)\s+`?([\w.]+)`?(?:\s+(?:as\s+)?(?!on\b|where\b|join\b|inner\b|left\b|right\b|cross\b|natural\b|group\b|order\b|limit\b|using\b)(\w+))?")
+
+
+@dataclass
+class PlanEstimate:
+    """What EXPLAIN says a query will cost."""
+    rows_examined: int
+    full_scans: list[str] = field(default_factory=list)
+    cost: float | None = None
+    dialect: str = ""
+
+
+@dataclass
+class GuardResult:
+    """
+    Pre-execution verdict for one query.
+
+    `sql` is the statement to actually run: the original one, or a row-capped
+    version when the verdict is "limit".
+    """
+    verdict: str
+    sql: str
+    reason: str = ""
+    estimate: PlanEstimate | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "verdict": self.verdict,
+            "sql": self.sql,
+            "reason": self.reason,
+            "rows_examined": self.estimate.rows_examined if self.estimate else None,
+            "full_scans": self.estimate.full_scans if self.estimate else [],
+            "cost": self.estimate.cost if self.estimate else None,
+        }
+
+
+def _strip_statement(sql_query: str) -> str:
+    return sql_query.strip().rstrip(";").strip()
+
+
+def _mysql_table(table: dict, prefix: float, estimate: dict) -> float:
+    """Add one table access of a MySQL JSON plan to `estimate`; returns rows produced so far."""
+    per_scan = float(table.get("rows_examined_per_scan", 0) or 0)
+    estimate["rows"] += prefix * per_scan
+    if table.get("access_type") == "ALL":
+        estimate["full_scans"].append(table.get("table_name", "?"))
+    for key, value in table.items():
+        if isinstance(value, (dict, list)) and key != "used_columns":
+            _mysql_walk(value, estimate)
+    return float(table.get("rows_produced_per_join", prefix * per_scan) or 0)
+
+
+def _mysql_walk(node, estimate: dict):
+    if isinstance(node, list):
+        for item in node:
+            _mysql_walk(item, estimate)
+        return
+    if not isinstance(node, dict):
+        return
+    if "nested_loop" in node:
+        prefix = 1.0
+        for item in node["nested_loop"]:
+            if "table" in item:
+                prefix = _mysql_table(item["table"], prefix, estimate)
+            else:
+                _mysql_walk(item, estimate)
+    elif "table" in node and isinstance(node["table"], dict):
+        _mysql_table(node["table"], 1.0, estimate)
+    for key, value in node.items():
+        if key not in ("nested_loop", "table") and isinstance(value, (dict, list)):
+            _mysql_walk(value, estimate)
+
+
+def _explain_mysql(conn, sql_query: str) -> PlanEstimate:
+    plan = json.loads(conn.exec_driver_sql(f"EXPLAIN FORMAT=JSON {sql_query}").scalar())
+    estimate = {"rows": 0.0, "full_scans": []}
+    _mysql_walk(plan, estimate)
+    cost = plan.get("query_block", {}).get("cost_info", {}).get("query_cost")
+    return PlanEstimate(int(estimate["rows"]), estimate["full_scans"], float(cost) if cost else None, "mysql")
+
+
+_sqlite_stats: dict[tuple, tuple[float, object]] = {}
+_sqlite_stats_lock = threading.Lock()
+
+
+def _cached_stat(key: tuple, load):
+    """Table and index statistics, cached for SCHEMA_REFRESH_INTERVAL seconds."""
+    cached = _sqlite_stats.get(key)
+    if cached is not None and time.monotonic() - cached[0] < SCHEMA_REFRESH_INTERVAL:
+        return cached[1]
+    value = load()
+    with _sqlite_stats_lock:
+        _sqlite_stats[key] = (time.monotonic(), value)
+    return value
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sqlite_table_rows(conn, database: str, table: str) -> int:
+    """Approximate row count of a SQLite table."""
+    def load():
+        try:
+            # MAX(rowid) is an index lookup; COUNT(*) would scan the table we are trying not to scan.
+            return int(conn.exec_driver_sql(f"SELECT MAX(rowid) FROM {_quote(table)}").scalar() or 0)
+        except Exception:
+            return int(conn.exec_driver_sql(f"SELECT COUNT(*) FROM {_quote(table)}").scalar() or 0)
+    return _cached_stat((database, "table", table), load)
+
+
+def _sqlite_index_stats(conn, database: str, table: str, index: str) -> tuple[list[int] | None, bool, int]:
+    """`sqlite_stat1` row counts (if ANALYZE has run), uniqueness and column count of an index."""
+    def load():
+        stats = None
+        try:
+            row = conn.exec_driver_sql("SELECT stat FROM sqlite_stat1 WHERE idx = ?", (index,)).scalar()
+            if row:
+                stats = [int(n) for n in row.split()[:-1] if n.isdigit()] or None
+        except Exception:
+            pass  # no sqlite_stat1 table
+        unique = any(r[1] == index and r[2] for r in conn.exec_driver_sql(f"PRAGMA index_list({_quote(table)})"))
+        columns = len(conn.exec_driver_sql(f"PRAGMA index_info({_quote(index)})").fetchall())
+        return stats, unique, columns
+    return _cached_stat((database, "index", index), load)
+
+
+def _sqlite_search_rows(conn, database: str, table: str, detail: str) -> int:
+    """Rows one index SEARCH step visits per outer row."""
+    if "rowid=?" in detail:
+        return 1
+    match = _SQLITE_INDEX.search(detail)
+    if not match:
+        return SQLITE_SEARCH_FANOUT
+    index, terms = match.groups()
+    terms = terms.split(" AND ")
+    equal = sum(term.endswith("=?") for term in terms)
+    ranged = len(terms) > equal
+    stats, unique, columns = _sqlite_index_stats(conn, database, table, index)
+    if stats:
+        # stat = [rows, rows per distinct first column, ... per distinct first two columns, ...]
+        rows = stats[min(equal, len(stats) - 1)]
+        # SQLite's planner assumes a range keeps about a quarter of the rows.
+        return max(rows // 4 if ranged else rows, 1)
+    if unique and equal >= columns and not ranged:
+        return 1
+    return SQLITE_SEARCH_FANOUT
+
+
+def _explain_sqlite(conn, sql_query: str, database: str) -> PlanEstimate:
+    aliases = {}
+    for table, alias in _TABLE_ALIAS.findall(normalize_sql(sql_query)):
+        table = table.split(".")[-1]
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+
+    # Steps sharing a parent form one nested loop; subqueries get their own parent id.
+    loops: dict[int, float] = {}
+    rows = 0.0
+    full_scans = []
+    for _, parent, _, detail in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql_query}"):
+        match = _SQLITE_STEP.match(detail)
+        # "SCAN CONSTANT ROW" is a VALUES/literal SELECT, not a table.
+        if not match or detail.startswith("SCAN CONSTANT ROW"):
+            continue
+        op, name, alias = match.groups()
+        table = aliases.get(name.lower(), name) if not alias else name
+        prefix = loops.get(parent, 1.0)
+        if op == "SCAN":
+            per_scan = _sqlite_table_rows(conn, database, table)
+            full_scans.append(table)
+        else:
+            per_scan = _sqlite_search_rows(conn, database, table, detail)
+        rows += prefix * per_scan
+        loops[parent] = prefix * max(per_scan, 1)
+    return PlanEstimate(int(rows), full_scans, None, "sqlite")
+
+
+def explain_query(sql_query: str, database: str = "employees") -> PlanEstimate:
+    """
+    Estimate the rows `sql_query` will examine, without running it.
+
+    MySQL: `EXPLAIN FORMAT=JSON`, summing rows examined per scan times the rows
+    produced by the tables joined before it. SQLite: `EXPLAIN QUERY PLAN`, which has no row
+    estimates, so full scans count the table's size and index searches use
+    `sqlite_stat1` when ANALYZE has run, 1 row for a fully bound unique index
+    and SQLITE_SEARCH_FANOUT rows otherwise.
+    """
+    sql_query = _strip_statement(sql_query)
+    engine = get_engine(database)
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            return _explain_sqlite(conn, sql_query, database)
+        return _explain_mysql(conn, sql_query)
+
+
+def read_only_problem(sql_query: str, dialect: str = "mysql") -> str | None:
+    """
+    Why `sql_query` is not a single read-only SELECT/WITH query, or None if it is.
+
+    Decided on the sqlglot parse tree: anything but one `exp.Query` (SELECT,
+    UNION, ...) is refused, as are queries containing a write or session
+    statement, SELECT ... INTO and locking reads (FOR UPDATE/SHARE).
+    """
+    try:
+        statements = [s for s in sqlglot.parse(_strip_statement(sql_query), read=dialect) if s is not None]
+    except sqlglot.errors.SqlglotError as e:
+        return f"could not be parsed ({e})"
+    if len(statements) != 1:
+        return f"{len(statements)} statements instead of one" if statements else "empty statement"
+    tree = statements[0]
+    if not isinstance(tree, exp.Query):
+        return f"{tree.key.upper()} statement, not a SELECT"
+    write = tree.find(*_WRITE_NODES)
+    if write is not None:
+        return f"contains a {write.key.upper()} statement"
+    if any(select.args.get("into") for select in tree.find_all(exp.Select)):
+        return "SELECT ... INTO writes its result"
+    if tree.find(exp.Lock):
+        return "locking read (FOR UPDATE/SHARE)"
+    return None
+
+
+def limit_query(sql_query: str, limit: int = QUERY_AUTO_LIMIT, dialect: str = "mysql") -> str:
+    """Cap the rows returned by `sql_query` (see `src.paging.cap_rows`)."""
+    return cap_rows(sql_query, limit, dialect)
+
+
+def guard_query(sql_query: str, database: str = "employees", warn_rows: int = QUERY_WARN_ROWS,
+                limit_rows: int = QUERY_LIMIT_ROWS, reject_rows: int = QUERY_REJECT_ROWS) -> GuardResult:
+    """
+    Decide whether `sql_query` may run, based on its EXPLAIN estimate.
+
+    - "run": below `warn_rows` rows examined.
+    - "warn": at least `warn_rows`; runs unchanged.
+    - "limit": at least `limit_rows`; runs capped to QUERY_AUTO_LIMIT result rows.
+    - "reject": at least `reject_rows`; must not run.
+
+    Anything but a single read-only SELECT/WITH query (see `read_only_problem`)
+    is rejected without an estimate. Queries EXPLAIN cannot handle get "run"
+    without an estimate so the database reports any error itself.
+
+    Returns:
+        GuardResult: The verdict, the SQL to execute and the estimate.
+    """
+    problem = read_only_problem(sql_query, get_engine(database).dialect.name)
+    if problem is not None:
+        logger.warning(f"Query guard reject: not a read-only query, {problem}")
+        return GuardResult("reject", sql_query, f"not a read-only query: {problem}")
+    try:
+        estimate = explain_query(sql_query, database)
+    except Exception as e:
+        logger.warning(f"EXPLAIN failed, running query unguarded: {e}")
+        return GuardResult("run", sql_query, f"no plan available: {e}")
+
+    reason = f"about {estimate.rows_examined:,} rows examined"
+    if estimate.full_scans:
+        reason += f", full scans of {', '.join(dict.fromkeys(estimate.full_scans))}"
+
+    if estimate.rows_examined >= reject_rows:
+        verdict, sql = "reject", sql_query
+    elif estimate.rows_examined >= limit_rows:
+        verdict, sql = "limit", limit_query(sql_query, dialect=estimate.dialect)
+        reason += f"; result capped at {QUERY_AUTO_LIMIT:,} rows"
+    elif estimate.rows_examined >= warn_rows:
+        verdict, sql = "warn", sql_query
+    else:
+        verdict, sql = "run", sql_query
+
+    if verdict != "run":
+        logger.info(f"Query guard {verdict}: {reason}")
+    return GuardResult(verdict, sql, reason, estimate)
+
+
+def rewrite_feedback(result: GuardResult) -> str:
+    """Message asking the model for a cheaper (or read-only) version of a query the guard flagged."""
+    if result.estimate is None:
+        return (
+            f"The query you wrote cannot be run ({result.reason}). Only a single read-only SELECT "
+            "(optionally with WITH) is allowed. Rewrite it as one. Answer in the same JSON format."
+        )
+    return (
+        f"The query you wrote is too expensive to run ({result.reason}). "
+        "Rewrite it so it examines far fewer rows: join tables on their keys, add the filters the "
+        "question implies (current rows have to_date = '9999-01-01'), and avoid cartesian products. "
+        "Answer in the same JSON format."
+    )
@@ -0,0 +1,196 @@
+import hashlib
+import queue
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from config.logging_config import get_logger
+from config.settings import (
+    RERANKER_MODEL,
+    RERANKER_THREADS,
+    RERANKER_BATCH_WAIT_MS,
+    RERANKER_MAX_BATCH,
+    RERANKER_CACHE_SIZE,
+)
+
+logger = get_logger('src.reranker')
+
+
+def _load_cross_encoder(model_name: str, threads: int):
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+    return CrossEncoder(model_name)
+
+
+class RerankerService:
+    """
+    Process-resident cross-encoder that batches scoring requests across callers.
+
+    The model is loaded once, on first use. Callers submit (query, document)
+    pairs; a single worker thread collects the pairs arriving within a short
+    wait window (or until `max_batch` pairs are queued) and scores them with one
+    `predict` call. Scores are cached per (query, document hash), so identical
+    pairs are never scored twice.
+
+    Args:
+        model_name: Cross-encoder model to load.
+        threads: CPU threads for inference (torch.set_num_threads). 0 keeps the default.
+        batch_wait_ms: How long the worker waits for more requests after the first one.
+        max_batch: Maximum number of pairs scored in one batch.
+        cache_size: Number of (query, document) scores kept in the LRU cache.
+        model_factory: Callable (model_name, threads) -> object with `predict(pairs)`.
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL, threads: int = RERANKER_THREADS,
+                 batch_wait_ms: float = RERANKER_BATCH_WAIT_MS, max_batch: int = RERANKER_MAX_BATCH,
+                 cache_size: int = RERANKER_CACHE_SIZE, model_factory=_load_cross_encoder):
+        self.model_name = model_name
+        self.threads = threads
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._model_factory = model_factory
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._cache: OrderedDict[tuple, float] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._batches: deque = deque(maxlen=1000)
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    self._model = self._model_factory(self.model_name, self.threads)
+                    logger.info(f"Loaded reranker {self.model_name} in {time.perf_counter() - started:.2f}s")
+        return self._model
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._worker_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="reranker-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            pairs = len(batch[0][0])
+            deadline = time.monotonic() + self.batch_wait
+            while pairs < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                pairs += len(request[0])
+            self._score_batch(batch)
+
+    def _score_batch(self, batch):
+        all_pairs = [pair for pairs, _ in batch for pair in pairs]
+        started = time.perf_counter()
+        try:
+            scores = [float(s) for s in self.model.predict(all_pairs)]
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - started
+        self._batches.append((len(batch), len(all_pairs), elapsed))
+        logger.debug(f"Reranked {len(all_pairs)} pair(s) from {len(batch)} request(s) in {elapsed * 1000:.1f}ms")
+
+        offset = 0
+        for pairs, future in batch:
+            future.set_result(scores[offset:offset + len(pairs)])
+            offset += len(pairs)
+
+    @staticmethod
+    def _doc_hash(doc: str) -> str:
+        return hashlib.sha1(doc.encode("utf-8")).hexdigest()
+
+    def score(self, query: str, docs: list[str]) -> list[float]:
+        """Return cross-encoder scores of `docs` against `query`, in order."""
+        keys = [(query, self._doc_hash(doc)) for doc in docs]
+        scores: dict[tuple, float] = {}
+        with self._cache_lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+            self.cache_hits += len(scores)
+            self.cache_misses += len(keys) - len(scores)
+
+        missing = {key: doc for key, doc in zip(keys, docs) if key not in scores}
+        if missing:
+            self._ensure_worker()
+            future = Future()
+            self._queue.put(([[query, doc] for doc in missing.values()], future))
+            computed = dict(zip(missing, future.result()))
+            scores.update(computed)
+            with self._cache_lock:
+                self._cache.update(computed)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [scores[key] for key in keys]
+
+    def rerank(self, query: str, docs: list, top_k: int | None = None, key=None) -> list:
+        """
+        Order `docs` by cross-encoder score against `query`.
+
+        Args:
+            query: The user question.
+            docs: Items to rerank.
+            top_k: Keep only the best `top_k` items.
+            key: Callable turning an item into the text to score (default: the item itself).
+
+        Returns:
+            list: (score, item) tuples, best first.
+        """
+        if not docs:
+            return []
+        texts = [key(doc) if key else doc for doc in docs]
+        ranked = sorted(zip(self.score(query, texts), docs), key=lambda x: x[0], reverse=True)
+        return ranked[:top_k] if top_k else ranked
+
+    def stats(self) -> dict:
+        """Batch sizes and per-batch latency over the last 1000 batches, plus cache counters."""
+        batches = list(self._batches)
+        latencies = sorted(b[2] * 1000 for b in batches)
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "batches": len(batches),
+            "avg_requests_per_batch": statistics.fmean(b[0] for b in batches) if batches else 0.0,
+            "avg_pairs_per_batch": statistics.fmean(b[1] for b in batches) if batches else 0.0,
+            "batch_ms_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "batch_ms_p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+        }
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> RerankerService:
+    """Return the process-wide reranker service."""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = RerankerService()
+    return _reranker
@@ -0,0 +1,250 @@
+import functools
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+import pyarrow as pa
+import sqlglot
+from sqlglot import exp
+
+from config.logging_config import get_logger
+from config.settings import RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES
+from src.dataframes import table_to_dataframe
+
+logger = get_logger('src.result_cache')
+
+# Order matters: literals and quoted identifiers first so comment markers inside them survive.
+_SQL_TOKEN = re.compile(
+    r"""
+    (?P<literal>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    |(?P<quoted>`(?:[^`]|``)*`)
+    |(?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+    |(?P<space>\s+)
+    |(?P<other>[^'"`\s\-#/]+|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_TABLE_REF = re.compile(r"\b(?:from|join)\s+((?:`[^`]+`|\w+)(?:\.(?:`[^`]+`|\w+))?(?:\s*(?:as\s+)?\w+)?(?:\s*,\s*(?:`[^`]+`|\w+)(?:\.(?:`[^`]+`|\w+))?(?:\s*(?:as\s+)?\w+)?)*)")
+_CACHEABLE = re.compile(r"^\(?\s*(select|with)\b")
+# Functions whose value changes between runs of the same query (clock, randomness,
+# connection state); results of queries calling them are never cached.
+VOLATILE_FUNCTIONS = frozenset({
+    "NOW", "SYSDATE", "CURDATE", "CURTIME", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP",
+    "LOCALTIME", "LOCALTIMESTAMP", "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP", "UNIX_TIMESTAMP",
+    "RAND", "RANDOM", "RANDOMBLOB", "UUID", "UUID_SHORT",
+    "CONNECTION_ID", "LAST_INSERT_ID", "ROW_COUNT", "FOUND_ROWS", "CHANGES",
+})
+
+
+def normalize_sql(sql_query: str) -> str:
+    """
+    Canonicalize SQL for cache lookups.
+
+    Comments are removed, whitespace is collapsed, keywords and identifiers are
+    lower-cased and a trailing semicolon is dropped. String literals are kept
+    verbatim so `'Baaz'` and `'baaz'` stay different queries.
+    """
+    parts = []
+    for match in _SQL_TOKEN.finditer(sql_query):
+        kind = match.lastgroup
+        token = match.group()
+        if kind == "literal":
+            parts.append(token)
+        elif kind in ("comment", "space"):
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        else:
+            parts.append(token.lower())
+    normalized = "".join(parts).strip()
+    while normalized.endswith(";"):
+        normalized = normalized[:-1].rstrip()
+    return normalized
+
+
+def sql_fingerprint(sql_query: str) -> str:
+    return hashlib.sha256(normalize_sql(sql_query).encode("utf-8")).hexdigest()
+
+
+def referenced_tables(sql_query: str) -> set[str]:
+    """Best-effort set of table names following FROM/JOIN in `sql_query`."""
+    tables = set()
+    for group in _TABLE_REF.findall(normalize_sql(sql_query)):
+        for item in group.split(","):
+            name = item.strip().split()[0].split(".")[-1].strip("`")
+            if name and name != "(":
+                tables.add(name)
+    return tables
+
+
+@functools.lru_cache(maxsize=1024)
+def volatile_function(sql_query: str, dialect: str | None = None) -> str | None:
+    """
+    Name of the first nondeterministic function `sql_query` calls, or None.
+
+    Checked on the sqlglot parse tree, so names inside string literals or
+    comments do not count. SQL that cannot be parsed is reported as "unparseable".
+    """
+    try:
+        statements = [s for s in sqlglot.parse(sql_query, read=dialect) if s is not None]
+    except sqlglot.errors.SqlglotError:
+        return "unparseable"
+    for statement in statements:
+        for node in statement.find_all(exp.Func):
+            # Functions sqlglot does not know keep their own name, known ones map to a canonical one
+            name = (node.name if isinstance(node, exp.Anonymous) else node.sql_name()).upper()
+            if name in VOLATILE_FUNCTIONS:
+                return name
+        # SQLite reads the clock through its date functions, e.g. DATE('now')
+        for literal in statement.find_all(exp.Literal):
+            if literal.is_string and literal.this.lower() == "now" and isinstance(literal.parent, exp.Func):
+                return f"{literal.parent.sql_name()}('now')"
+    return None
+
+
+def is_cacheable(sql_query: str, dialect: str | None = None) -> bool:
+    """Only read-only SELECT/WITH statements that call no volatile functions are cached."""
+    if not _CACHEABLE.match(normalize_sql(sql_query)):
+        return False
+    function = volatile_function(sql_query, dialect)
+    if function is not None:
+        logger.debug(f"Result not cacheable, the query calls {function}")
+        return False
+    return True
+
+
+def dataframe_to_ipc(df: pd.DataFrame) -> bytes:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return table_to_ipc(table)
+
+
+def table_to_ipc(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def ipc_to_dataframe(payload: bytes) -> pd.DataFrame:
+    return table_to_dataframe(pa.ipc.open_stream(payload).read_all())
+
+
+@dataclass
+class _CacheEntry:
+    payload: bytes
+    tables: frozenset
+    rows: int
+    expires_at: float
+
+
+class ResultCache:
+    """
+    Thread-safe TTL + LRU cache of query results.
+
+    Entries are keyed by (database, SQL fingerprint) and stored as zstd-compressed
+    Arrow IPC streams, not pickled DataFrames. The total payload size is bounded
+    by `max_bytes`; least recently used entries are evicted first. Entries can be
+    invalidated per table, e.g. after a load into `salaries`.
+
+    Args:
+        ttl: Seconds an entry stays valid.
+        max_bytes: Upper bound on the total size of stored payloads.
+    """
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: OrderedDict[tuple, _CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(database: str, sql_query: str) -> tuple:
+        return (database, sql_fingerprint(sql_query))
+
+    def get_payload(self, database: str, sql_query: str) -> bytes | None:
+        key = self.make_key(database, sql_query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.payload
+
+    def get(self, database: str, sql_query: str) -> pd.DataFrame | None:
+        """Return the cached result of `sql_query` on `database`, or None."""
+        payload = self.get_payload(database, sql_query)
+        return ipc_to_dataframe(payload) if payload is not None else None
+
+    def put_payload(self, database: str, sql_query: str, payload: bytes, rows: int):
+        if len(payload) > self.max_bytes:
+            return
+        key = self.make_key(database, sql_query)
+        entry = _CacheEntry(payload, frozenset(referenced_tables(sql_query)), rows, time.monotonic() + self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def put(self, database: str, sql_query: str, df: pd.DataFrame):
+        """Store the result of `sql_query` on `database`."""
+        self.put_payload(database, sql_query, dataframe_to_ipc(df), len(df))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.payload)
+
+    def invalidate_table(self, table: str, database: str | None = None) -> int:
+        """
+        Drop every cached result that reads from `table`.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        table = table.lower()
+        with self._lock:
+            keys = [
+                key for key, entry in self._entries.items()
+                if table in entry.tables and (database is None or key[0] == database)
+            ]
+            for key in keys:
+                self._remove(key)
+        logger.info(f"Invalidated {len(keys)} cached result(s) for table {table}")
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+from config.logging_config import get_logger
+from config.settings import (
+    VECTOR_DB_DIR_TABLES,
+    VECTOR_DB_DIR_SAMPLEQ,
+    VECTOR_DB_COMBINE,
+    RETRIEVAL_MAX_WORKERS,
+    RRF_K,
+    RETRIEVAL_STRATEGY,
+    LEXICAL_CONFIDENCE_THRESHOLD,
+)
+from src.documents import table_name
+from src.lexical import get_lexical_index
+from src.result_cache import normalize_sql
+from src.vector_store import get_index, get_index_embeddings
+
+logger = get_logger('src.retrieval')
+
+# Indexes searched by `multi_index_search`; add new ones with `register_source`.
+RETRIEVAL_SOURCES = {
+    "tables": VECTOR_DB_DIR_TABLES,
+    "sample_queries": VECTOR_DB_DIR_SAMPLEQ,
+    "combined": VECTOR_DB_COMBINE,
+}
+
+_search_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_MAX_WORKERS, thread_name_prefix="retrieval")
+
+
+def register_source(name: str, path):
+    """Make the vector index saved at `path` searchable as `name`."""
+    RETRIEVAL_SOURCES[name] = path
+
+
+def document_key(doc: Document) -> str:
+    """
+    Identity of a document across indexes: the same table doc lives in TABLES
+    and COMBINED_DB. Sample queries are identified by their normalized SQL and
+    table docs by the table they describe, so re-rendered or re-indexed copies
+    still match; other documents by a hash of their text.
+    """
+    if doc.metadata.get("sql"):
+        return f"sql:{normalize_sql(doc.metadata['sql'])}"
+    if doc.metadata.get("type") == "tables-info" and table_name(doc):
+        return f"table:{table_name(doc)}"
+    return "doc:" + hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(ranked: dict[str, list[Document]], k: int = RRF_K,
+                           quotas: dict[str, int] | None = None, limit: int | None = None) -> list[Document]:
+    """
+    Merge ranked result lists with reciprocal-rank fusion.
+
+    Each document scores sum(1 / (k + rank)) over the lists it appears in.
+    A document counts against the quota of the source where it ranked best;
+    sources without a quota are unbounded.
+
+    Args:
+        ranked: Source name -> documents, best first.
+        k: RRF damping constant.
+        quotas: Maximum number of documents per source in the output.
+        limit: Maximum number of documents overall.
+
+    Returns:
+        list[Document]: Fused documents, best first, with `rrf_score` and
+            `retrieval_sources` added to a copy of their metadata.
+    """
+    scores: dict[str, float] = {}
+    docs: dict[str, Document] = {}
+    best_source: dict[str, tuple[int, str]] = {}
+    sources: dict[str, list[str]] = {}
+
+    for source, results in ranked.items():
+        for rank, doc in enumerate(results, start=1):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+            sources.setdefault(key, []).append(source)
+            if key not in best_source or rank < best_source[key][0]:
+                best_source[key] = (rank, source)
+
+    taken: dict[str, int] = {}
+    fused = []
+    for key in sorted(scores, key=scores.get, reverse=True):
+        source = best_source[key][1]
+        if quotas and source in quotas and taken.get(source, 0) >= quotas[source]:
+            continue
+        taken[source] = taken.get(source, 0) + 1
+        doc = docs[key]
+        metadata = {**doc.metadata, "rrf_score": scores[key], "retrieval_sources": sources[key]}
+        fused.append(Document(page_content=doc.page_content, metadata=metadata, id=doc.id))
+        if limit is not None and len(fused) >= limit:
+            break
+    return fused
+
+
+def _search(source: str, embedding: list[float], k: int) -> list[Document]:
+    return get_index(RETRIEVAL_SOURCES[source]).similarity_search_by_vector(embedding, k=k)
+
+
+def multi_index_search(user_query: str, sources=None, k: int = 5, quotas: dict[str, int] | None = None,
+                       limit: int | None = None) -> list[Document]:
+    """
+    Embed `user_query` once, search several indexes concurrently and fuse the results.
+
+    Wall time is bounded by the slowest index rather than the sum of all of them.
+
+    Args:
+        user_query: The user question.
+        sources: Names from RETRIEVAL_SOURCES to search. Defaults to all of them.
+        k: Results fetched from each index.
+        quotas: Maximum number of documents per source in the output.
+        limit: Maximum number of documents overall.
+
+    Returns:
+        list[Document]: Fused documents, best first.
+    """
+    sources = list(sources or RETRIEVAL_SOURCES)
+    embedding = get_index_embeddings().embed_query(user_query)
+    futures = {source: _search_pool.submit(_search, source, embedding, k) for source in sources}
+    ranked = {source: future.result() for source, future in futures.items()}
+    return reciprocal_rank_fusion(ranked, quotas=quotas, limit=limit)
+
+
+async def amulti_index_search(user_query: str, sources=None, k: int = 5, quotas: dict[str, int] | None = None,
+                              limit: int | None = None) -> list[Document]:
+    """Async counterpart of `multi_index_search`."""
+    sources = list(sources or RETRIEVAL_SOURCES)
+    embeddings = await asyncio.to_thread(get_index_embeddings)
+    embedding = await embeddings.aembed_query(user_query)
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(_search_pool, _search, source, embedding, k) for source in sources)
+    )
+    return reciprocal_rank_fusion(dict(zip(sources, results)), quotas=quotas, limit=limit)
+
+
+def _lexical_hits(user_query: str, k: int, strategy: str):
+    """BM25 hits plus whether they are confident enough to skip the vector search."""
+    if strategy not in ("vector", "lexical", "hybrid"):
+        raise ValueError(f"Unknown retrieval strategy {strategy!r}")
+    if strategy == "vector":
+        return [], False
+    lexical = get_lexical_index()
+    hits = lexical.search(user_query, k)
+    confidence = lexical.confidence(user_query, hits)
+    confident = strategy == "lexical" or confidence >= LEXICAL_CONFIDENCE_THRESHOLD
+    if confident:
+        logger.debug(f"Lexical results ({confidence:.2f}) used without vector search for '{user_query}'")
+    return [doc for _, doc in hits], confident
+
+
+def combined_search(user_query: str, k: int = 5, strategy: str = RETRIEVAL_STRATEGY) -> list[Document]:
+    """
+    Search table docs and sample queries with the configured strategy.
+
+    - "vector": FAISS search over the combined index.
+    - "lexical": BM25 only; no embedding call, works offline.
+    - "hybrid": BM25 first; when its confidence reaches LEXICAL_CONFIDENCE_THRESHOLD
+      the lexical hits are returned as is, otherwise they are fused with the
+      FAISS results by reciprocal rank.
+    """
+    lexical_docs, confident = _lexical_hits(user_query, k, strategy)
+    if confident:
+        return lexical_docs
+    vector_docs = get_index(VECTOR_DB_COMBINE).similarity_search(user_query, k=k)
+    if strategy == "vector":
+        return vector_docs
+    return reciprocal_rank_fusion({"vector": vector_docs, "lexical": lexical_docs}, limit=k)
+
+
+async def acombined_search(user_query: str, k: int = 5, strategy: str = RETRIEVAL_STRATEGY) -> list[Document]:
+    """
+    Async counterpart of `combined_search`. BM25 and `get_index` (which may
+    stat, checksum or load the index files) run in worker threads.
+    """
+    lexical_docs, confident = await asyncio.to_thread(_lexical_hits, user_query, k, strategy)
+    if confident:
+        return lexical_docs
+    index = await asyncio.to_thread(get_index, VECTOR_DB_COMBINE)
+    vector_docs = await index.asimilarity_search(user_query, k=k)
+    if strategy == "vector":
+        return vector_docs
+    return reciprocal_rank_fusion({"vector": vector_docs, "lexical": lexical_docs}, limit=k)
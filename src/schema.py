@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sqlalchemy import text
+
+from config.logging_config import get_logger
+from config.settings import SCHEMA_CACHE_DIR, SCHEMA_REFRESH_INTERVAL, SCHEMA_RETRY_INTERVAL
+from src.sql import get_engine
+
+logger = get_logger('src.schema')
+
+_MYSQL_COLUMNS = text(
+    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY"
+    " FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()"
+    " ORDER BY TABLE_NAME, ORDINAL_POSITION"
+)
+_MYSQL_FOREIGN_KEYS = text(
+    "SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME"
+    " FROM information_schema.KEY_COLUMN_USAGE"
+    " WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL"
+    " ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION"
+)
+
+
+def _mysql_rows(conn) -> tuple[list, list]:
+    columns = [
+        (table, column, col_type, nullable == "YES", key == "PRI")
+        for table, column, col_type, nullable, key in conn.execute(_MYSQL_COLUMNS)
+    ]
+    return columns, [tuple(row) for row in conn.execute(_MYSQL_FOREIGN_KEYS)]
+
+
+def _sqlite_rows(conn) -> tuple[list, list]:
+    tables = [row[0] for row in conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    columns, foreign_keys = [], []
+    for table in tables:
+        quoted = '"' + table.replace('"', '""') + '"'
+        for _, column, col_type, notnull, _, pk in conn.exec_driver_sql(f"PRAGMA table_info({quoted})"):
+            columns.append((table, column, col_type.lower(), not notnull and not pk, pk > 0))
+        for row in conn.exec_driver_sql(f"PRAGMA foreign_key_list({quoted})"):
+            # (id, seq, table, from, to, on_update, on_delete, match)
+            foreign_keys.append((table, row[3], row[2], row[4]))
+    return columns, foreign_keys
+
+
+def _schema_rows(database: str) -> tuple[list, list]:
+    """(columns, foreign keys) rows for `database`, from information_schema or SQLite pragmas."""
+    engine = get_engine(database)
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            return _sqlite_rows(conn)
+        return _mysql_rows(conn)
+
+
+def schema_checksum(columns: list, foreign_keys: list) -> str:
+    payload = json.dumps([sorted(map(list, columns)), sorted(map(list, foreign_keys))], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SchemaSnapshot:
+    """
+    Tables, columns and foreign keys of one database, plus the shortest join
+    path between every pair of tables connected through foreign keys.
+
+    `paths[a][b]` is the list of join conditions leading from `a` to `b`, each
+    a (table, column, other_table, other_column) tuple.
+    """
+    database: str
+    checksum: str
+    tables: dict[str, list[dict]]
+    foreign_keys: list[tuple]
+    paths: dict[str, dict[str, list[tuple]]] = field(default_factory=dict)
+
+    @classmethod
+    def from_rows(cls, database: str, columns: list, foreign_keys: list) -> "SchemaSnapshot":
+        tables: dict[str, list[dict]] = {}
+        for table, column, col_type, nullable, primary in columns:
+            tables.setdefault(table, []).append(
+                {"name": column, "type": col_type, "nullable": bool(nullable), "primary": bool(primary)}
+            )
+        checksum = schema_checksum(columns, foreign_keys)
+        foreign_keys = [tuple(fk) for fk in foreign_keys if fk[0] in tables and fk[2] in tables]
+        snapshot = cls(database, checksum, tables, foreign_keys)
+        snapshot.paths = snapshot._shortest_paths()
+        return snapshot
+
+    def _graph(self) -> dict[str, list[tuple]]:
+        graph: dict[str, list[tuple]] = {table: [] for table in self.tables}
+        for table, column, ref_table, ref_column in self.foreign_keys:
+            graph[table].append((ref_table, (table, column, ref_table, ref_column)))
+            graph[ref_table].append((table, (ref_table, ref_column, table, column)))
+        return graph
+
+    def _shortest_paths(self) -> dict[str, dict[str, list[tuple]]]:
+        """BFS from every table over the undirected foreign-key graph."""
+        graph = self._graph()
+        paths = {}
+        for start in graph:
+            found = {start: []}
+            queue = deque([start])
+            while queue:
+                table = queue.popleft()
+                for neighbour, edge in graph[table]:
+                    if neighbour not in found:
+                        found[neighbour] = found[table] + [edge]
+                        queue.append(neighbour)
+            paths[start] = {table: path for table, path in found.items() if table != start}
+        return paths
+
+    def join_path(self, tables) -> list[tuple]:
+        """
+        Join conditions connecting `tables`, adding intermediate tables where needed.
+
+        Grows a tree from the first table, repeatedly attaching the remaining
+        table closest to any table already in it. Tables with no foreign-key
+        route to the others are left out.
+
+        Returns:
+            list[tuple]: (table, column, other_table, other_column) conditions in join order.
+        """
+        wanted = [table for table in dict.fromkeys(tables) if table in self.tables]
+        if len(wanted) < 2:
+            return []
+        tree = {wanted[0]}
+        edges = []
+        remaining = set(wanted[1:])
+        while remaining:
+            best = None
+            for target in remaining:
+                for source in tree:
+                    path = self.paths[source].get(target)
+                    if path is not None and (best is None or len(path) < len(best[1])):
+                        best = (target, path)
+            if best is None:
+                break
+            target, path = best
+            for edge in path:
+                if edge[2] not in tree:
+                    edges.append(edge)
+                    tree.add(edge[2])
+            remaining.discard(target)
+        return edges
+
+    def render(self, tables) -> str:
+        """
+        Compact "tables + join path" block for `tables` and any tables needed to join them.
+
+        Example:
+            Tables:
+            employees(emp_no int PK, first_name varchar(14), ...)
+            dept_emp(emp_no int PK FK>employees.emp_no, dept_no char(4) PK FK>departments.dept_no, ...)
+            Join path:
+            employees.emp_no = dept_emp.emp_no
+        """
+        joins = self.join_path(tables)
+        names = list(dict.fromkeys([t for t in tables if t in self.tables] + [edge[2] for edge in joins]))
+        if not names:
+            return ""
+        references = {(table, column): f"{ref_table}.{ref_column}"
+                      for table, column, ref_table, ref_column in self.foreign_keys}
+
+        lines = ["Tables:"]
+        for table in names:
+            columns = []
+            for column in self.tables[table]:
+                rendered = f"{column['name']} {column['type']}"
+                if column["primary"]:
+                    rendered += " PK"
+                if (table, column["name"]) in references:
+                    rendered += f" FK>{references[(table, column['name'])]}"
+                columns.append(rendered)
+            lines.append(f"{table}({', '.join(columns)})")
+        if joins:
+            lines.append("Join path:")
+            lines.extend(f"{a}.{a_col} = {b}.{b_col}" for a, a_col, b, b_col in joins)
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "database": self.database,
+            "checksum": self.checksum,
+            "tables": self.tables,
+            "foreign_keys": [list(fk) for fk in self.foreign_keys],
+            "paths": {a: {b: [list(edge) for edge in path] for b, path in targets.items()}
+                      for a, targets in self.paths.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SchemaSnapshot":
+        return cls(
+            data["database"],
+            data["checksum"],
+            data["tables"],
+            [tuple(fk) for fk in data["foreign_keys"]],
+            {a: {b: [tuple(edge) for edge in path] for b, path in targets.items()}
+             for a, targets in data["paths"].items()},
+        )
+
+
+class SchemaRegistry:
+    """
+    Per-database schema snapshots, persisted as JSON and refreshed only when the schema changes.
+
+    At most every `refresh_interval` seconds the catalog is read again and
+    checksummed; the graph and join paths are recomputed (and the snapshot
+    file rewritten) only when the checksum differs. A saved snapshot is used
+    at startup without touching the database; a failed refresh keeps the
+    snapshot already loaded. Without one, the failure is remembered and
+    lookups fail fast for `retry_interval` seconds instead of each querying an
+    unreachable database.
+
+    The catalog is read under a per-database lock, so a slow database only
+    delays lookups of its own schema.
+
+    Args:
+        cache_dir: Directory holding `{database}.json` snapshots.
+        refresh_interval: Seconds between two catalog checks for the same database.
+        retry_interval: Seconds before retrying a database whose catalog could not be read.
+    """
+
+    def __init__(self, cache_dir=SCHEMA_CACHE_DIR, refresh_interval: float = SCHEMA_REFRESH_INTERVAL,
+                 retry_interval: float = SCHEMA_RETRY_INTERVAL):
+        self.cache_dir = Path(cache_dir)
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._snapshots: dict[str, SchemaSnapshot] = {}
+        self._checked_at: dict[str, float] = {}
+        self._failures: dict[str, tuple[float, Exception]] = {}
+        self._lock = threading.Lock()
+        self._database_locks: dict[str, threading.Lock] = {}
+
+    def _database_lock(self, database: str) -> threading.Lock:
+        with self._lock:
+            return self._database_locks.setdefault(database, threading.Lock())
+
+    def _path(self, database: str) -> Path:
+        return self.cache_dir / f"{database}.json"
+
+    def _load_saved(self, database: str) -> SchemaSnapshot | None:
+        path = self._path(database)
+        if not path.exists():
+            return None
+        try:
+            with path.open(encoding="utf-8") as f:
+                return SchemaSnapshot.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable schema snapshot {path}: {e}")
+            return None
+
+    def _save(self, snapshot: SchemaSnapshot):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(snapshot.database)
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(snapshot.to_dict(), f)
+        os.replace(tmp, path)
+
+    def refresh(self, database: str, force: bool = False) -> SchemaSnapshot:
+        """Read the catalog of `database`, rebuilding the snapshot if its checksum changed."""
+        started = time.monotonic()
+        with self._database_lock(database):
+            # Another thread may have refreshed the snapshot while we waited.
+            current = self._snapshots.get(database)
+            if not force and current is not None and self._checked_at.get(database, 0.0) >= started:
+                return current
+            current = current or self._load_saved(database)
+            try:
+                columns, foreign_keys = _schema_rows(database)
+            except Exception as e:
+                now = time.monotonic()
+                if current is None:
+                    with self._lock:
+                        self._failures[database] = (now, e)
+                    raise
+                logger.warning(f"Schema refresh for {database} failed ({e}), keeping snapshot {current.checksum[:12]}")
+                with self._lock:
+                    self._snapshots[database] = current
+                    self._checked_at[database] = now
+                return current
+
+            checksum = schema_checksum(columns, foreign_keys)
+            if force or current is None or current.checksum != checksum:
+                current = SchemaSnapshot.from_rows(database, columns, foreign_keys)
+                self._save(current)
+                logger.info(f"Schema snapshot for {database}: {len(current.tables)} table(s), "
+                            f"{len(current.foreign_keys)} foreign key(s), checksum {current.checksum[:12]}")
+            with self._lock:
+                self._snapshots[database] = current
+                self._checked_at[database] = time.monotonic()
+                self._failures.pop(database, None)
+            return current
+
+    def get(self, database: str = "employees") -> SchemaSnapshot:
+        """Return the snapshot of `database`, checking for schema changes at most every `refresh_interval`."""
+        snapshot = self._snapshots.get(database)
+        if snapshot is None:
+            saved = self._load_saved(database)
+            if saved is not None:
+                with self._lock:
+                    snapshot = self._snapshots.setdefault(database, saved)
+                    self._checked_at.setdefault(database, time.monotonic())
+        if snapshot is None:
+            failure = self._failures.get(database)
+            if failure is not None and time.monotonic() - failure[0] < self.retry_interval:
+                failed_at, error = failure
+                raise RuntimeError(
+                    f"Schema of {database} unavailable, catalog read failed "
+                    f"{time.monotonic() - failed_at:.0f}s ago: {error}"
+                ) from error
+        checked_at = self._checked_at.get(database)
+        if snapshot is None or checked_at is None or time.monotonic() - checked_at >= self.refresh_interval:
+            snapshot = self.refresh(database)
+        return snapshot
+
+
+schema_registry = SchemaRegistry()
+
+
+def get_schema(database: str = "employees") -> SchemaSnapshot:
+    """Shortcut for `schema_registry.get(database)`."""
+    return schema_registry.get(database)
+
+
+def schema_context(tables, database: str = "employees") -> str:
+    """Compact "tables + join path" block for `tables` in `database`."""
+    return get_schema(database).render(tables)
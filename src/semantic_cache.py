@@ -0,0 +1,219 @@
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from config.logging_config import get_logger
+from config.settings import (
+    SEMANTIC_CACHE_DIR,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+)
+
+logger = get_logger('src.semantic_cache')
+
+_QUOTED = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+_WORD = re.compile(r"[^\W\d_][\w'-]*")
+# Nearest entries checked for matching literals before a lookup counts as a miss.
+_CANDIDATES = 5
+
+
+def question_literals(question: str) -> frozenset:
+    """
+    Values a question names rather than paraphrases: quoted strings, numbers
+    and capitalised words (names, except the question's first word). "hired
+    in 1995" and "hired in 1996" embed almost identically but must not share
+    an answer.
+    """
+    literals = {("quoted", a or b) for a, b in _QUOTED.findall(question)}
+    rest = _QUOTED.sub(" ", question)
+    literals.update(("number", n) for n in _NUMBER.findall(rest))
+    words = _WORD.findall(rest)
+    literals.update(("name", w.lower()) for w in words[1:] if w[0].isupper())
+    return frozenset(literals)
+
+
+
+@dataclass
+class CacheEntry:
+    question: str
+    response: dict
+    retrieved_docs: list
+    latency: float
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class _Namespace:
+    """One FAISS inner-product index plus its entries, for a single database."""
+
+    def __init__(self, dim: int, version: str = ""):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.entries: dict[int, CacheEntry] = {}
+        self.next_id = 0
+        self.version = version
+
+
+class SemanticCache:
+    """
+    Answer cache for near-duplicate questions.
+
+    Each answered question is stored with its embedding, the `SQLResponse` and
+    the retrieved documents. A new question whose cosine similarity to a stored
+    one reaches `threshold`, and that names the same literals (see
+    `question_literals`), is answered from the cache without running the
+    agent. Entries are kept per namespace (database), evicted least recently
+    used beyond `max_entries`, and persisted under `path` so they survive restarts.
+    Each namespace records the `version` (e.g. schema and index checksums) its
+    answers were produced with; a lookup or store with another version first
+    drops the stale entries.
+
+    Args:
+        embeddings: Embeddings object used to embed questions.
+        threshold: Minimum cosine similarity for a hit.
+        max_entries: Maximum number of entries per namespace.
+        path: Directory for the persisted indexes. None keeps the cache in memory only.
+    """
+
+    def __init__(self, embeddings, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, path=SEMANTIC_CACHE_DIR):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = Path(path) if path is not None else None
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._namespaces: dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray([self.embeddings.embed_query(question)], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _namespace(self, name: str, dim: int, version: str) -> _Namespace:
+        ns = self._namespaces.get(name)
+        if ns is None:
+            ns = self._load(name)
+        if ns is None or ns.version != version:
+            if ns is not None and ns.entries:
+                logger.info(f"Dropping {len(ns.entries)} semantic cache entries of {name}: version changed")
+            ns = _Namespace(dim, version)
+        self._namespaces[name] = ns
+        return ns
+
+    def lookup(self, question: str, namespace: str, version: str = "") -> tuple[CacheEntry, float] | None:
+        """
+        Return the closest cached entry naming the same literals and its
+        similarity, or None when there is none at or above the threshold.
+        """
+        vector = self._embed(question)
+        with self._lock:
+            ns = self._namespace(namespace, vector.shape[1], version)
+            if ns.index.ntotal == 0:
+                self.misses += 1
+                return None
+            literals = question_literals(question)
+            scores, ids = ns.index.search(vector, min(_CANDIDATES, ns.index.ntotal))
+            hit = None
+            for score, entry_id in zip(scores[0].tolist(), ids[0].tolist()):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                if question_literals(ns.entries[entry_id].question) == literals:
+                    hit = ns.entries[entry_id], score
+                    break
+                logger.debug(f"Semantic cache candidate '{ns.entries[entry_id].question}' names other literals")
+            if hit is None:
+                self.misses += 1
+                return None
+            entry, score = hit
+            entry.last_used = time.time()
+            entry.hits += 1
+            self.hits += 1
+            self.saved_seconds += entry.latency
+        logger.info(f"Semantic cache hit ({score:.3f}) for '{question}' -> '{entry.question}'")
+        return entry, score
+
+    def store(self, question: str, namespace: str, response: dict, retrieved_docs: list, latency: float,
+              version: str = ""):
+        """Add an answered question to `namespace`, evicting the least recently used entries if full."""
+        vector = self._embed(question)
+        with self._lock:
+            ns = self._namespace(namespace, vector.shape[1], version)
+            entry_id = ns.next_id
+            ns.next_id += 1
+            ns.index.add_with_ids(vector, np.asarray([entry_id], dtype=np.int64))
+            ns.entries[entry_id] = CacheEntry(question, response, retrieved_docs, latency)
+
+            overflow = len(ns.entries) - self.max_entries
+            if overflow > 0:
+                victims = sorted(ns.entries, key=lambda i: ns.entries[i].last_used)[:overflow]
+                ns.index.remove_ids(np.asarray(victims, dtype=np.int64))
+                for victim in victims:
+                    del ns.entries[victim]
+            self._save(namespace, ns)
+
+    def clear(self, namespace: str | None = None):
+        with self._lock:
+            names = [namespace] if namespace is not None else list(self._namespaces)
+            for name in names:
+                self._namespaces.pop(name, None)
+                if self.path is not None:
+                    for suffix in ("faiss", "json"):
+                        (self.path / f"{name}.{suffix}").unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "entries": {name: len(ns.entries) for name, ns in self._namespaces.items()},
+            "threshold": self.threshold,
+        }
+
+    def _save(self, name: str, ns: _Namespace):
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        index_file = self.path / f"{name}.faiss"
+        entries_file = self.path / f"{name}.json"
+        faiss.write_index(ns.index, f"{index_file}.tmp")
+        with open(f"{entries_file}.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "version": ns.version,
+                "next_id": ns.next_id,
+                "entries": {i: asdict(e) for i, e in ns.entries.items()},
+            }, f)
+        os.replace(f"{index_file}.tmp", index_file)
+        os.replace(f"{entries_file}.tmp", entries_file)
+
+    def _load(self, name: str) -> _Namespace | None:
+        if self.path is None:
+            return None
+        index_file = self.path / f"{name}.faiss"
+        entries_file = self.path / f"{name}.json"
+        if not index_file.exists() or not entries_file.exists():
+            return None
+        try:
+            with open(entries_file, encoding="utf-8") as f:
+                data = json.load(f)
+            ns = _Namespace.__new__(_Namespace)
+            ns.index = faiss.read_index(str(index_file))
+            ns.entries = {int(i): CacheEntry(**e) for i, e in data["entries"].items()}
+            ns.next_id = data["next_id"]
+            ns.version = data.get("version", "")
+            return ns
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable semantic cache {name}: {e}")
+            return None
@@ -1,8 +1,27 @@
 
-from langchain_core.tools import tool
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from config.settings import TESTING, EMBEDDING_MODEL, VECTOR_DB_DIR_TABLES, VECTOR_DB_DIR_SAMPLEQ, VECTOR_DB_COMBINE
+import asyncio
+
+from langchain_core.tools import StructuredTool
+from config.logging_config import get_logger
+from config.settings import (
+    TESTING,
+    VECTOR_DB_DIR_TABLES,
+    VECTOR_DB_DIR_SAMPLEQ,
+    COMBINED_K,
+    RERANK_ENABLED,
+    RERANK_FETCH_K,
+    SCHEMA_CONTEXT_ENABLED,
+)
+from src.context import pack_context
+from src.documents import table_name
+from src.metrics import current_request, timed_retriever
+from src.reranker import get_reranker
+from src.result_cache import referenced_tables
+from src.retrieval import multi_index_search, combined_search, acombined_search
+from src.schema import get_schema
+from src.vector_store import get_index
+
+logger = get_logger('src.tools')
 
 
 def table_info_retriever(user_query: str) -> list[str]:
@@ -13,8 +32,7 @@ def table_info_retriever(user_query: str) -> list[str]:
     if TESTING:
         return ["Dummy context"]
     
-    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
-    faiss_db = FAISS.load_local(VECTOR_DB_DIR_TABLES, embeddings, allow_dangerous_deserialization=True)
+    faiss_db = get_index(VECTOR_DB_DIR_TABLES)
     results = faiss_db.similarity_search(user_query, k=3)
 
     return [doc.page_content for doc in results]
@@ -27,25 +45,107 @@ def sample_query_retriever(user_query: str) -> list[str]:
     if TESTING:
         return ["Dummy context"]
     
-    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
-    faiss_db = FAISS.load_local(VECTOR_DB_DIR_SAMPLEQ, embeddings, allow_dangerous_deserialization=True)
+    faiss_db = get_index(VECTOR_DB_DIR_SAMPLEQ)
     results = faiss_db.similarity_search(user_query, k=3)
 
     return [doc.page_content for doc in results]
 
-@tool
-def combined_retriever(user_query:str):
+def _documents_artifact(results) -> list[dict]:
+    """Plain-dict copy of retrieved documents, attached to the ToolMessage as its artifact."""
+    return [{'page_content': doc.page_content, 'metadata': dict(doc.metadata)} for doc in results]
+
+
+def _rerank_documents(user_query: str, results: list) -> list:
+    """Optional stage after retrieval: keep the COMBINED_K best documents by cross-encoder score."""
+    ranked = get_reranker().rerank(user_query, results, top_k=COMBINED_K, key=lambda doc: doc.page_content)
+    return [doc for score, doc in ranked]
+
+
+def _request_database() -> str:
+    """Database the current question targets (see `request_scope`); "employees" outside a request."""
+    request = current_request()
+    return (request or {}).get("database") or "employees"
+
+
+def _schema_header(results, database: str | None = None) -> tuple[str, list]:
+    """
+    Split `results` into a schema block and the documents still to be sent.
+
+    With SCHEMA_CONTEXT_ENABLED, table docs for tables the schema snapshot of
+    `database` (default: the current request's) knows are replaced by one
+    compact "tables + join path" block covering them and the tables used by
+    the retrieved sample queries; everything else is kept.
+    """
+    if not SCHEMA_CONTEXT_ENABLED:
+        return "", results
+    try:
+        snapshot = get_schema(database or _request_database())
+    except Exception as e:
+        logger.warning(f"Schema snapshot unavailable, sending table docs: {e}")
+        return "", results
+
+    tables = []
+    rest = []
+    for doc in results:
+        if doc.metadata.get("type") == "tables-info" and table_name(doc) in snapshot.tables:
+            tables.append(table_name(doc))
+            continue
+        if doc.metadata.get("sql"):
+            tables.extend(t for t in sorted(referenced_tables(doc.metadata["sql"])) if t in snapshot.tables)
+        rest.append(doc)
+
+    block = snapshot.render(tables)
+    return (block, rest) if block else ("", results)
+
+
+def _tool_content(results) -> str:
+    """Text the model reads for `results`: the schema block plus the other documents, packed to CONTEXT_TOKEN_BUDGET."""
+    header, rest = _schema_header(results)
+    packed = pack_context(rest, header=header)
+    logger.info(
+        f"Packed {packed.included} document(s) into {packed.tokens} tokens, {packed.tokens_saved} saved "
+        f"({packed.duplicates} duplicate(s), {packed.dropped} over budget)"
+    )
+    return packed.text
+
+
+@timed_retriever("combined_retriever")
+def _combined_retriever(user_query: str):
     """
     Retrieve relevant table schema and sample queries based on the user query.
     """
-    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
-    faiss_db = FAISS.load_local(VECTOR_DB_COMBINE, embeddings, allow_dangerous_deserialization=True)
-    results = faiss_db.similarity_search(user_query, k=5)
+    if RERANK_ENABLED:
+        results = _rerank_documents(user_query, combined_search(user_query, k=RERANK_FETCH_K))
+    else:
+        results = combined_search(user_query, k=COMBINED_K)
+
+    # The model reads the text; callers read the documents from `ToolMessage.artifact`.
+    return _tool_content(results), _documents_artifact(results)
+
+
+@timed_retriever("combined_retriever")
+async def _acombined_retriever(user_query: str):
+    """
+    Async variant of `combined_retriever`: the query embedding is awaited instead of blocking.
+    """
+    if RERANK_ENABLED:
+        results = await acombined_search(user_query, k=RERANK_FETCH_K)
+        results = await asyncio.to_thread(_rerank_documents, user_query, results)
+    else:
+        results = await acombined_search(user_query, k=COMBINED_K)
+    return await asyncio.to_thread(_tool_content, results), _documents_artifact(results)
 
-    # return [{'source':doc.metadata.get('source'), 'type':doc.metadata.get('type'), 'content':doc.page_content, 'sql'} for doc in results]
-    return results
 
+combined_retriever = StructuredTool.from_function(
+    func=_combined_retriever,
+    coroutine=_acombined_retriever,
+    name="combined_retriever",
+    description="Retrieve relevant table schema and sample queries based on the user query.",
+    response_format="content_and_artifact",
+)
 
+
+@timed_retriever("reranker_retriever")
 def reranker_retriever(user_query: str) -> str:
     """
     Retrieve relevant table schema and sample queries based on the user query.
@@ -54,25 +154,19 @@ def reranker_retriever(user_query: str) -> str:
     # if TESTING:
     #     return "Dummy context"
 
-    table_docs = table_info_retriever(user_query)
-    sample_docs = sample_query_retriever(user_query)
-    
-    all_docs = table_docs + sample_docs
+    if TESTING:
+        all_docs = table_info_retriever(user_query) + sample_query_retriever(user_query)
+    else:
+        # One embedding call, both indexes searched concurrently
+        fused = multi_index_search(user_query, sources=("tables", "sample_queries"), k=3,
+                                   quotas={"tables": 3, "sample_queries": 3})
+        all_docs = [doc.page_content for doc in fused]
     
     if not all_docs:
         return ""
 
-    from sentence_transformers import CrossEncoder
-    model = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-    
-    pairs = [[user_query, doc] for doc in all_docs]
-    scores = model.predict(pairs)
-    
-    # Sort by score descending
-    scored_docs = sorted(zip(scores, all_docs), key=lambda x: x[0], reverse=True)
-    
     # Take top 3
-    top_docs = [doc for score, doc in scored_docs[:3]]
+    top_docs = [doc for score, doc in get_reranker().rerank(user_query, all_docs, top_k=3)]
     
     context = ""
     for doc in top_docs:
@@ -1,6 +1,14 @@
 import ast
+import functools
 import re
 
+import tiktoken
+
+from config.logging_config import get_logger
+from config.settings import MODEL
+
+logger = get_logger('src.utils')
+
 
 def tool_messages_to_documents_json(messages, tool_name=None):
     """
@@ -54,3 +62,64 @@ def tool_messages_to_documents_json(messages, tool_name=None):
             })
 
     return docs
+
+
+def tool_messages_to_documents(messages, tool_name=None):
+    """
+    Collect the documents returned by retriever tools.
+
+    Tools that respond with content and artifact (see `combined_retriever`) attach
+    their documents to `ToolMessage.artifact`, which is read as is. Messages
+    without an artifact (older transcripts, plain dicts) fall back to
+    `tool_messages_to_documents_json`.
+
+    Args:
+        messages: Iterable of message dicts or objects.
+        tool_name: Optional name to filter messages by their `name` field.
+
+    Returns:
+        List[dict]: documents of the form {"page_content": ..., "metadata": ...}.
+    """
+    docs = []
+    for msg in messages:
+        if isinstance(msg, dict):
+            m_type = msg.get('type') or msg.get('role')
+            name = msg.get('name') or msg.get('tool')
+            artifact = msg.get('artifact')
+        else:
+            m_type = getattr(msg, 'type', None) or getattr(msg, 'role', None)
+            name = getattr(msg, 'name', None)
+            artifact = getattr(msg, 'artifact', None)
+
+        if m_type != 'tool':
+            continue
+
+        if tool_name is not None and name != tool_name:
+            continue
+
+        if artifact is not None:
+            docs.extend(artifact)
+        else:
+            docs.extend(tool_messages_to_documents_json([msg], tool_name=tool_name))
+
+    return docs
+
+
+@functools.lru_cache(maxsize=1)
+def _token_encoding():
+    try:
+        return tiktoken.encoding_for_model(MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use; offline, fall back to an estimate.
+        logger.warning(f"Token encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of `MODEL` tokens in `text` (about 4 characters per token when tiktoken is unavailable)."""
+    encoding = _token_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from config.logging_config import get_logger
+from config.settings import VECTOR_DB_MANIFEST, VECTOR_DB_RELOAD_INTERVAL
+from src.embeddings import get_embeddings
+from src.mmap_store import MMAP_FILES, MmapVectorStore, is_mmap_store
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+logger = get_logger('src.vector_store')
+
+INDEX_FILES = ("index.faiss", "index.pkl")
+
+
+@dataclass(frozen=True)
+class _IndexEntry:
+    store: "FAISS | MmapVectorStore"
+    stat_key: tuple
+    checksum: str
+    loaded_at: float
+    checked_at: float
+
+
+def _index_files(path: Path) -> tuple:
+    return MMAP_FILES if is_mmap_store(path) else INDEX_FILES
+
+
+def _stat_key(path: Path) -> tuple:
+    """Cheap change detector: (mtime_ns, size) of every index file."""
+    key = []
+    for name in _index_files(path):
+        st = (path / name).stat()
+        key.append((st.st_mtime_ns, st.st_size))
+    return tuple(key)
+
+
+def _load(path: Path, embeddings):
+    if is_mmap_store(path):
+        return MmapVectorStore(path, embeddings)
+    from langchain_community.vectorstores import FAISS
+
+    # Legacy LangChain layout: index.pkl is a pickled docstore.
+    return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+
+def _store_size(store) -> int:
+    return store.ntotal if isinstance(store, MmapVectorStore) else store.index.ntotal
+
+
+def _checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    for name in _index_files(path):
+        with (path / name).open("rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def current_build(manifest_path=VECTOR_DB_MANIFEST) -> Path | None:
+    """
+    Directory of the index build `manifest.json` points to.
+
+    Returns None when there is no manifest or it predates versioned builds; the
+    indexes then live directly under `vector_db/`.
+    """
+    manifest_path = Path(manifest_path)
+    try:
+        with manifest_path.open(encoding="utf-8") as f:
+            build = json.load(f).get("build")
+    except FileNotFoundError:
+        return None
+    return manifest_path.parent / build if build else None
+
+
+def index_path(path, build: Path | None) -> Path:
+    """Where the index `path` (e.g. VECTOR_DB_DIR_TABLES) lives in `build`, or `path` itself without one."""
+    return build / Path(path).name if build is not None else Path(path)
+
+
+class IndexRegistry:
+    """
+    Process-wide cache of vector stores keyed by their directory.
+
+    Directories written by `python -m src.build_index` hold a memory-mapped
+    `MmapVectorStore`; directories with only `index.faiss`/`index.pkl` are
+    loaded as LangChain FAISS stores. Each index is opened once and shared by every caller (and every
+    Streamlit session). When the files on disk change, the new index is loaded
+    off to the side and swapped in atomically; readers never see a partially
+    loaded store. Change detection uses file mtime/size, confirmed by a content
+    checksum so a plain `touch` does not trigger a reload.
+
+    Indexes next to the manifest (TABLES, SAMPLEQ_DB, COMBINED_DB) are read from
+    the build it points to. `src.build_index` writes a new build to its own
+    directory and then replaces the manifest, so all three indexes switch to
+    the new build together.
+
+    Args:
+        embeddings_factory: Zero-argument callable returning the embeddings object
+            used to embed queries against the loaded indexes.
+        reload_interval: Minimum number of seconds between two on-disk change checks
+            for the same index (and of the manifest). 0 checks on every access.
+        manifest_path: Manifest naming the current build.
+    """
+
+    def __init__(self, embeddings_factory, reload_interval: float = VECTOR_DB_RELOAD_INTERVAL,
+                 manifest_path=VECTOR_DB_MANIFEST):
+        self._embeddings_factory = embeddings_factory
+        self._embeddings = None
+        self._reload_interval = reload_interval
+        self._manifest_path = Path(manifest_path)
+        self._build: Path | None = None
+        self._build_checked_at: float | None = None
+        self._entries: dict[str, _IndexEntry] = {}
+        self._lock = threading.Lock()
+        self._path_locks: dict[str, threading.Lock] = {}
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self._embeddings_factory()
+        return self._embeddings
+
+    def _path_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._path_locks.setdefault(key, threading.Lock())
+
+    def _resolve(self, path: Path) -> Path:
+        if path.parent.resolve() != self._manifest_path.parent.resolve():
+            return path
+        now = time.monotonic()
+        with self._lock:
+            if self._build_checked_at is None or now - self._build_checked_at >= self._reload_interval:
+                try:
+                    build = current_build(self._manifest_path)
+                except (OSError, ValueError) as e:
+                    # Unreadable manifest: keep serving the build we have.
+                    logger.warning(f"Reading {self._manifest_path} failed ({e}), keeping build {self._build}")
+                    build = self._build
+                if build != self._build and self._build is not None:
+                    # Release the previous build's stores; nobody asks for its paths any more.
+                    old = str(self._build.resolve())
+                    self._entries = {k: v for k, v in self._entries.items() if Path(k).parent != Path(old)}
+                    logger.info(f"Switching indexes to build {build}")
+                self._build = build
+                self._build_checked_at = now
+            return index_path(path, self._build)
+
+    def get(self, path) -> "FAISS | MmapVectorStore":
+        """
+        Return the vector store saved at `path`, loading or reloading it if needed.
+
+        Args:
+            path: Directory containing an mmap store or `index.faiss` and `index.pkl`,
+                or one of the index paths the manifest's build provides.
+
+        Returns:
+            FAISS | MmapVectorStore: The shared vector store instance.
+        """
+        path = self._resolve(Path(path))
+        key = str(path.resolve())
+
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked_at < self._reload_interval:
+            return entry.store
+
+        with self._path_lock(key):
+            # Another thread may have refreshed the entry while we waited.
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and now - entry.checked_at < self._reload_interval:
+                return entry.store
+
+            try:
+                stat_key = _stat_key(path)
+            except FileNotFoundError:
+                if entry is not None:
+                    logger.warning(f"Index files missing under {path}, keeping loaded version")
+                    return entry.store
+                raise
+
+            if entry is not None and entry.stat_key == stat_key:
+                self._entries[key] = _IndexEntry(entry.store, stat_key, entry.checksum, entry.loaded_at, now)
+                return entry.store
+
+            checksum = _checksum(path)
+            if entry is not None and entry.checksum == checksum:
+                self._entries[key] = _IndexEntry(entry.store, stat_key, checksum, entry.loaded_at, now)
+                return entry.store
+
+            try:
+                started = time.perf_counter()
+                store = _load(path, self.embeddings)
+            except Exception as e:
+                if entry is not None:
+                    # Files are probably mid-write; serve the previous index and retry later.
+                    logger.warning(f"Reloading index {path} failed ({e}), keeping loaded version")
+                    return entry.store
+                logger.error(f"Error loading index {path}: {e}")
+                raise
+
+            self._entries[key] = _IndexEntry(store, stat_key, checksum, time.time(), now)
+            action = "Reloaded" if entry is not None else "Loaded"
+            logger.info(f"{action} index {path} in {time.perf_counter() - started:.3f}s")
+            return store
+
+    def checksum(self, path) -> str:
+        """Content checksum of the index currently served for `path`, loading it if needed."""
+        self.get(path)
+        return self._entries[str(self._resolve(Path(path)).resolve())].checksum
+
+    def invalidate(self, path=None):
+        """Drop one cached index (or all of them) so the next access reloads from disk."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._build_checked_at = None
+            else:
+                self._entries.pop(str(Path(path).resolve()), None)
+
+    def stats(self) -> dict:
+        """Return a mapping of loaded index path -> load time and checksum."""
+        return {
+            key: {"loaded_at": entry.loaded_at, "checksum": entry.checksum, "size": _store_size(entry.store)}
+            for key, entry in list(self._entries.items())
+        }
+
+
+index_registry = IndexRegistry(get_embeddings)
+
+
+def get_index(path) -> "FAISS | MmapVectorStore":
+    """Shortcut for `index_registry.get(path)`."""
+    return index_registry.get(path)
+
+
+def index_checksum(path) -> str:
+    """Shortcut for `index_registry.checksum(path)`."""
+    return index_registry.checksum(path)
+
+
+def get_index_embeddings():
+    """Embeddings object the registry's indexes embed queries with."""
+    return index_registry.embeddings
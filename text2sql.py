@@ -1,16 +1,42 @@
 import streamlit as st
-import json
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+import uuid
 
-from src.agents import agent_app as agent
-from src.sql import run_query_df
-from src.utils import tool_messages_to_documents_json
+from src.agents import final_answer, get_agent_app, get_semantic_cache, stream_answer
+from config.settings import (
+    EXPORT_DOWNLOAD_MAX_BYTES, GRAPH_MODE, QUERY_GUARD_ENABLED, QUERY_EXPORT_TIMEOUT_SECONDS, SEMANTIC_CACHE_ENABLED,
+)
+from src.dataframes import dataframe_to_table
+from src.lexical import get_lexical_index
+from src.metrics import request_scope, start_metrics_server
+from src.paging import QueryPager
+from src.query_guard import guard_query
+from src.sql import (
+    ChunkWriter, QueryCancelled, cancel_queries, get_engine, new_export_path, query_owner, stream_query_df,
+)
 
 # Set page config
 st.set_page_config(page_title="Text2SQL App", layout="centered")
 
+# Progress label per graph node while an answer streams in
+NODE_STATUS = {
+    "agent": "Thinking...",
+    "tools": "Retrieving context...",
+    "retrieve": "Retrieving context...",
+    "mark_called": "Retrieving context...",
+    "generate": "Generating SQL...",
+    "rewrite": "Query plan too expensive, asking for a cheaper query...",
+}
+
 with st.sidebar:
-    database = st.selectbox("Explore Database",("employees"))
+    database = st.selectbox("Explore Database",("employees",))
+    export_format = st.radio("Export format", ("csv", "parquet"), horizontal=True)
+    use_answer_cache = st.checkbox("Reuse answers to similar questions", value=SEMANTIC_CACHE_ENABLED)
+    graph_mode = st.selectbox(
+        "Agent mode",
+        ("agent", "single_shot"),
+        index=("agent", "single_shot").index(GRAPH_MODE),
+        help="single_shot retrieves context directly and makes one LLM call instead of two.",
+    )
 
     st.markdown("## About")
     st.markdown(
@@ -51,6 +77,85 @@ if 'response' not in st.session_state:
     st.session_state.response = None
 if 'df_result' not in st.session_state:
     st.session_state.df_result = None
+if 'session_key' not in st.session_state:
+    st.session_state.session_key = uuid.uuid4().hex
+
+
+def cancel_running_query():
+    # Runs at the start of the rerun the click triggers, while the old run may still wait on the database
+    if cancel_queries(st.session_state.session_key):
+        st.session_state.query_error = "Query cancelled."
+
+
+@st.cache_resource(show_spinner=False)
+def load_engine(database: str):
+    """Pooled (and warmed) engine, created once per process instead of on every rerun."""
+    return get_engine(database)
+
+
+@st.cache_resource(show_spinner="Loading the agent...")
+def load_agent(mode: str):
+    """Compiled graph plus the indexes and caches it uses, built once per process and shared by all sessions."""
+    start_metrics_server()
+    get_lexical_index()
+    get_semantic_cache()
+    return get_agent_app(mode)
+
+
+def render_retrieved_docs(docs: list):
+    """Retrieved documents in an expander, with sample queries and table docs in separate tabs."""
+    with st.expander("📚 Retrieved Context", expanded=False):
+        # Separate documents by type
+        sample_queries = [doc for doc in docs if doc.get('metadata', {}).get('type') == 'sample-queries']
+        table_info = [doc for doc in docs if doc.get('metadata', {}).get('type') == 'tables-info']
+
+        # Create tabs if we have both types
+        if sample_queries and table_info:
+            tab1, tab2 = st.tabs([f"📝 Sample Queries ({len(sample_queries)})", f"📊 Table Info ({len(table_info)})"])
+
+            with tab1:
+                for idx, doc in enumerate(sample_queries, 1):
+                    with st.container():
+                        st.markdown(f"**{idx}. {doc['page_content']}**")
+                        if 'sql' in doc.get('metadata', {}):
+                            st.code(doc['metadata']['sql'], language="sql")
+                        st.divider()
+
+            with tab2:
+                for idx, doc in enumerate(table_info, 1):
+                    table_name = doc.get('metadata', {}).get('table_name', f'Document {idx}')
+                    with st.expander(f"📋 {table_name}"):
+                        st.markdown(doc['page_content'].replace('\\n','\n'), unsafe_allow_html=True)
+
+        # If only one type exists
+        elif sample_queries:
+            for idx, doc in enumerate(sample_queries, 1):
+                with st.container():
+                    st.markdown(f"**{idx}. {doc['page_content']}**")
+                    if 'sql' in doc.get('metadata', {}):
+                        st.code(doc['metadata']['sql'], language="sql")
+                    st.divider()
+
+        elif table_info:
+            for idx, doc in enumerate(table_info, 1):
+                table_name = doc.get('metadata', {}).get('table_name', f'Document {idx}')
+                with st.expander(f"📋 {table_name}"):
+                    st.markdown(doc['page_content'])
+
+
+def run_cancellable(label: str, fn):
+    """Run `fn` (which queries the database) behind a spinner and a Cancel button; None if it was stopped."""
+    cancel_slot = st.empty()
+    cancel_slot.button("Cancel query", on_click=cancel_running_query, key=f"cancel_{label}")
+    try:
+        with query_owner(st.session_state.session_key), st.spinner(label):
+            return fn()
+    except QueryCancelled as e:
+        st.session_state.query_error = str(e)
+        return None
+    finally:
+        cancel_slot.empty()
+
 
 # Add vertical spacing before input when no results
 if st.session_state.response is None:
@@ -68,90 +173,184 @@ with col2:
     
     send_button = st.button("Send", width='stretch', type="primary")
 
+# Heavy resources load after the page is drawn; later reruns get them from the resource cache
+try:
+    load_engine(database)
+except ValueError as e:
+    st.sidebar.warning(str(e))
+load_agent(graph_mode)
+
 # Process when send button is clicked
 if send_button and user_question:
     st.session_state.response = None
     st.session_state.df_result = None
     st.session_state.retrieved_docs = None
+    st.session_state.guard = None
+    st.session_state.pager = None
+    st.session_state.page = None
+    st.session_state.query_error = None
+    # A re-asked question abandons the previous one; stop its query instead of letting it run on
+    cancel_queries(st.session_state.session_key)
+    if st.session_state.get('export_path'):
+        st.session_state.export_path.unlink(missing_ok=True)
+        st.session_state.export_path = None
     
-    # Show loading spinner while agent is processing
-    with st.spinner("Processing your question..."):
-
-        response = agent.invoke({"messages": [HumanMessage(content=user_question)]})
+    with request_scope(source="ui", question=user_question, database=database, mode=graph_mode):
+        # Stream progress while the agent runs: node status, retrieved context, then the SQL as it is generated
+        progress = st.empty()
+        with progress.container():
+            status = st.status("Processing your question...")
+            context_slot = st.empty()
+            explanation_slot = st.empty()
+            sql_slot = st.empty()
+        response = None
+        for event, payload in stream_answer(user_question, database, bypass_cache=not use_answer_cache, mode=graph_mode):
+            if event == "status":
+                status.update(label=NODE_STATUS.get(payload, f"Running {payload}..."))
+                if payload == "rewrite":
+                    explanation_slot.empty()
+                    sql_slot.empty()
+            elif event == "context":
+                with context_slot.container():
+                    render_retrieved_docs(payload)
+            elif event == "partial":
+                if payload.get('explanation'):
+                    explanation_slot.write(payload['explanation'])
+                if payload.get('sql_query'):
+                    sql_slot.code(payload['sql_query'], language="sql", wrap_lines=True)
+            else:
+                response = payload
+        # The complete answer is rendered below from session state
+        progress.empty()
 
-#         response = {'messages': [HumanMessage(content='give me count of employees gender wise in each department', additional_kwargs={}, response_metadata={}),
-#   AIMessage(content='', additional_kwargs={'refusal': None}, response_metadata={'token_usage': {'completion_tokens': 27, 'prompt_tokens': 351, 'total_tokens': 378, 'completion_tokens_details': {'accepted_prediction_tokens': 0, 'audio_tokens': 0, 'reasoning_tokens': 0, 'rejected_prediction_tokens': 0}, 'prompt_tokens_details': {'audio_tokens': 0, 'cached_tokens': 0}}, 'model_provider': 'openai', 'model_name': 'gpt-4.1-nano-2025-04-14', 'system_fingerprint': 'fp_93ba275753', 'id': 'chatcmpl-D4TUbT5XTkcAmWLPwiesnspOEL7h4', 'service_tier': 'default', 'finish_reason': 'tool_calls', 'logprobs': None}, id='lc_run--019c19c7-d86e-7642-9254-4a30ac430f3d-0', tool_calls=[{'name': 'combined_retriever', 'args': {'user_query': 'give me count of employees gender wise in each department'}, 'id': 'call_c7g6GSBeGLzATSRtOlLni9yN', 'type': 'tool_call'}], usage_metadata={'input_tokens': 351, 'output_tokens': 27, 'total_tokens': 378, 'input_token_details': {'audio': 0, 'cache_read': 0}, 'output_token_details': {'audio': 0, 'reasoning': 0}}),
-#   ToolMessage(content='[Document(id=\'08eeab66-1b46-4c75-a44c-c02d3c9444b6\', metadata={\'sql\': "SELECT d.dept_name, COUNT(de.emp_no) AS employee_count\\nFROM departments d\\nJOIN dept_emp de ON d.dept_no = de.dept_no\\nWHERE de.to_date = \'9999-01-01\'\\nGROUP BY d.dept_name\\nORDER BY employee_count DESC;", \'source\': \'queries.json\', \'index\': 2, \'type\': \'sample-queries\', \'token_count\': 8}, page_content=\'Find the number of employees per department.\'), Document(id=\'8f35b281-22d9-4fa3-b1b9-b29fca92094f\', metadata={\'sql\': "SELECT \\n    d.dept_name, \\n    e.first_name, \\n    e.last_name\\nFROM dept_manager dm\\nJOIN departments d ON dm.dept_no = d.dept_no\\nJOIN employees e ON dm.emp_no = e.emp_no\\nWHERE dm.to_date = \'9999-01-01\';", \'source\': \'queries.json\', \'index\': 3, \'type\': \'sample-queries\', \'token_count\': 10}, page_content=\'Get the list of department managers and their departments.\'), Document(id=\'e3b9593b-fbe6-47f3-bf53-83d72d9683f9\', metadata={\'sql\': "SELECT d.dept_name, AVG(s.salary) AS avg_salary\\nFROM departments d\\nJOIN dept_emp de ON d.dept_no = de.dept_no\\nJOIN salaries s ON de.emp_no = s.emp_no\\nWHERE de.to_date = \'9999-01-01\' AND s.to_date = \'9999-01-01\'\\nGROUP BY d.dept_name\\nORDER BY avg_salary DESC;", \'source\': \'queries.json\', \'index\': 5, \'type\': \'sample-queries\', \'token_count\': 7}, page_content=\'Get the average salary by department.\'), Document(id=\'566e7799-7006-4183-aa1e-463566881529\', metadata={\'source\': \'d:\\\\code\\\\text2sql\\\\data\\\\tables\\\\dep_manager.md\', \'table_name\': \'dep_manager\', \'token_count\': 117, \'index\': 103, \'type\': \'tables-info\'}, page_content=\'## Table Name: `dept_manager`\\n\\n- **Description**: Records the managerial assignments of employees to departments.\\n- **Composite Primary Key**: `dept_no`, `emp_no`, `from_date`\\n- **Foreign Keys**:\\n    - `dept_no`: References `departments(dept_no)`\\n    - `emp_no`: References `employees(emp_no)`\\n\\n### Columns:\\n- `dept_no`: Department number.\\n- `emp_no`: Employee number.\\n- `from_date`: Start date of the managerial assignment.\\n- `to_date`: End date of the managerial assignment.\'), Document(id=\'94cecafa-c14c-4bd3-ae67-614c96eb99b4\', metadata={\'source\': \'d:\\\\code\\\\text2sql\\\\data\\\\tables\\\\dep_emp.md\', \'table_name\': \'dep_emp\', \'token_count\': 122, \'index\': 102, \'type\': \'tables-info\'}, page_content=\'## Table Name: `dept_emp`\\n\\n- **Description**: Associates employees with the departments they have worked in, including the duration.\\n- **Composite Primary Key**: `emp_no`, `dept_no`, `from_date`\\n- **Foreign Keys**:\\n    - `emp_no`: References `employees(emp_no)`\\n    - `dept_no`: References `departments(dept_no)`\\n\\n### Columns:\\n- `emp_no`: Employee number.\\n- `dept_no`: Department number.\\n- `from_date`: Start date of the department assignment.\\n- `to_date`: End date of the department assignment.\')]', name='combined_retriever', tool_call_id='call_c7g6GSBeGLzATSRtOlLni9yN'),
-#   AIMessage(content='{"sql_query": "SELECT d.dept_name, e.gender, COUNT(e.emp_no) AS employee_count\\nFROM departments d\\nJOIN dept_emp de ON d.dept_no = de.dept_no\\nJOIN employees e ON de.emp_no = e.emp_no\\nWHERE de.to_date = \'9999-01-01\'\\nGROUP BY d.dept_name, e.gender\\nORDER BY d.dept_name, e.gender;", "explanation": "The query uses the \'departments\', \'dept_emp\', and \'employees\' tables to count employees grouped by department and gender."}', additional_kwargs={'refusal': None}, response_metadata={'token_usage': {'completion_tokens': 120, 'prompt_tokens': 1200, 'total_tokens': 1320, 'completion_tokens_details': {'accepted_prediction_tokens': 0, 'audio_tokens': 0, 'reasoning_tokens': 0, 'rejected_prediction_tokens': 0}, 'prompt_tokens_details': {'audio_tokens': 0, 'cached_tokens': 0}}, 'model_provider': 'openai', 'model_name': 'gpt-4.1-nano-2025-04-14', 'system_fingerprint': 'fp_93ba275753', 'id': 'chatcmpl-D4TUftPslC46c4QkISlaMfvevFk6N', 'service_tier': 'default', 'finish_reason': 'stop', 'logprobs': None}, id='lc_run--019c19c7-e456-7180-b5f0-8a483c32c8fa-0', usage_metadata={'input_tokens': 1200, 'output_tokens': 120, 'total_tokens': 1320, 'input_token_details': {'audio': 0, 'cache_read': 0}, 'output_token_details': {'audio': 0, 'reasoning': 0}})],
-#  'tool_called': True}
+    #         response = {'messages': [HumanMessage(content='give me count of employees gender wise in each department', additional_kwargs={}, response_metadata={}),
+    #   AIMessage(content='', additional_kwargs={'refusal': None}, response_metadata={'token_usage': {'completion_tokens': 27, 'prompt_tokens': 351, 'total_tokens': 378, 'completion_tokens_details': {'accepted_prediction_tokens': 0, 'audio_tokens': 0, 'reasoning_tokens': 0, 'rejected_prediction_tokens': 0}, 'prompt_tokens_details': {'audio_tokens': 0, 'cached_tokens': 0}}, 'model_provider': 'openai', 'model_name': 'gpt-4.1-nano-2025-04-14', 'system_fingerprint': 'fp_93ba275753', 'id': 'chatcmpl-D4TUbT5XTkcAmWLPwiesnspOEL7h4', 'service_tier': 'default', 'finish_reason': 'tool_calls', 'logprobs': None}, id='lc_run--019c19c7-d86e-7642-9254-4a30ac430f3d-0', tool_calls=[{'name': 'combined_retriever', 'args': {'user_query': 'give me count of employees gender wise in each department'}, 'id': 'call_c7g6GSBeGLzATSRtOlLni9yN', 'type': 'tool_call'}], usage_metadata={'input_tokens': 351, 'output_tokens': 27, 'total_tokens': 378, 'input_token_details': {'audio': 0, 'cache_read': 0}, 'output_token_details': {'audio': 0, 'reasoning': 0}}),
+    #   ToolMessage(content='[Document(id=\'08eeab66-1b46-4c75-a44c-c02d3c9444b6\', metadata={\'sql\': "SELECT d.dept_name, COUNT(de.emp_no) AS employee_count\\nFROM departments d\\nJOIN dept_emp de ON d.dept_no = de.dept_no\\nWHERE de.to_date = \'9999-01-01\'\\nGROUP BY d.dept_name\\nORDER BY employee_count DESC;", \'source\': \'queries.json\', \'index\': 2, \'type\': \'sample-queries\', \'token_count\': 8}, page_content=\'Find the number of employees per department.\'), Document(id=\'8f35b281-22d9-4fa3-b1b9-b29fca92094f\', metadata={\'sql\': "SELECT \\n    d.dept_name, \\n    e.first_name, \\n    e.last_name\\nFROM dept_manager dm\\nJOIN departments d ON dm.dept_no = d.dept_no\\nJOIN employees e ON dm.emp_no = e.emp_no\\nWHERE dm.to_date = \'9999-01-01\';", \'source\': \'queries.json\', \'index\': 3, \'type\': \'sample-queries\', \'token_count\': 10}, page_content=\'Get the list of department managers and their departments.\'), Document(id=\'e3b9593b-fbe6-47f3-bf53-83d72d9683f9\', metadata={\'sql\': "SELECT d.dept_name, AVG(s.salary) AS avg_salary\\nFROM departments d\\nJOIN dept_emp de ON d.dept_no = de.dept_no\\nJOIN salaries s ON de.emp_no = s.emp_no\\nWHERE de.to_date = \'9999-01-01\' AND s.to_date = \'9999-01-01\'\\nGROUP BY d.dept_name\\nORDER BY avg_salary DESC;", \'source\': \'queries.json\', \'index\': 5, \'type\': \'sample-queries\', \'token_count\': 7}, page_content=\'Get the average salary by department.\'), Document(id=\'566e7799-7006-4183-aa1e-463566881529\', metadata={\'source\': \'d:\\\\code\\\\text2sql\\\\data\\\\tables\\\\dep_manager.md\', \'table_name\': \'dep_manager\', \'token_count\': 117, \'index\': 103, \'type\': \'tables-info\'}, page_content=\'## Table Name: `dept_manager`\\n\\n- **Description**: Records the managerial assignments of employees to departments.\\n- **Composite Primary Key**: `dept_no`, `emp_no`, `from_date`\\n- **Foreign Keys**:\\n    - `dept_no`: References `departments(dept_no)`\\n    - `emp_no`: References `employees(emp_no)`\\n\\n### Columns:\\n- `dept_no`: Department number.\\n- `emp_no`: Employee number.\\n- `from_date`: Start date of the managerial assignment.\\n- `to_date`: End date of the managerial assignment.\'), Document(id=\'94cecafa-c14c-4bd3-ae67-614c96eb99b4\', metadata={\'source\': \'d:\\\\code\\\\text2sql\\\\data\\\\tables\\\\dep_emp.md\', \'table_name\': \'dep_emp\', \'token_count\': 122, \'index\': 102, \'type\': \'tables-info\'}, page_content=\'## Table Name: `dept_emp`\\n\\n- **Description**: Associates employees with the departments they have worked in, including the duration.\\n- **Composite Primary Key**: `emp_no`, `dept_no`, `from_date`\\n- **Foreign Keys**:\\n    - `emp_no`: References `employees(emp_no)`\\n    - `dept_no`: References `departments(dept_no)`\\n\\n### Columns:\\n- `emp_no`: Employee number.\\n- `dept_no`: Department number.\\n- `from_date`: Start date of the department assignment.\\n- `to_date`: End date of the department assignment.\')]', name='combined_retriever', tool_call_id='call_c7g6GSBeGLzATSRtOlLni9yN'),
+    #   AIMessage(content='{"sql_query": "SELECT d.dept_name, e.gender, COUNT(e.emp_no) AS employee_count\\nFROM departments d\\nJOIN dept_emp de ON d.dept_no = de.dept_no\\nJOIN employees e ON de.emp_no = e.emp_no\\nWHERE de.to_date = \'9999-01-01\'\\nGROUP BY d.dept_name, e.gender\\nORDER BY d.dept_name, e.gender;", "explanation": "The query uses the \'departments\', \'dept_emp\', and \'employees\' tables to count employees grouped by department and gender."}', additional_kwargs={'refusal': None}, response_metadata={'token_usage': {'completion_tokens': 120, 'prompt_tokens': 1200, 'total_tokens': 1320, 'completion_tokens_details': {'accepted_prediction_tokens': 0, 'audio_tokens': 0, 'reasoning_tokens': 0, 'rejected_prediction_tokens': 0}, 'prompt_tokens_details': {'audio_tokens': 0, 'cached_tokens': 0}}, 'model_provider': 'openai', 'model_name': 'gpt-4.1-nano-2025-04-14', 'system_fingerprint': 'fp_93ba275753', 'id': 'chatcmpl-D4TUftPslC46c4QkISlaMfvevFk6N', 'service_tier': 'default', 'finish_reason': 'stop', 'logprobs': None}, id='lc_run--019c19c7-e456-7180-b5f0-8a483c32c8fa-0', usage_metadata={'input_tokens': 1200, 'output_tokens': 120, 'total_tokens': 1320, 'input_token_details': {'audio': 0, 'cache_read': 0}, 'output_token_details': {'audio': 0, 'reasoning': 0}})],
+    #  'tool_called': True}
 
-        st.session_state.retrieved_docs = tool_messages_to_documents_json(response['messages']) 
-        st.session_state.response = json.loads(response['messages'][-1].to_json()['kwargs']['content'])
+        st.session_state.retrieved_docs = response['retrieved_docs']
+        st.session_state.response = final_answer(response)
     
-    # Display explanation
-    if st.session_state.response:
-        st.write(st.session_state.response.get('explanation', 'No explanation provided'))
-        
-        # Display SQL query if not null
-        sql_query = st.session_state.response.get('sql_query')
+        st.session_state.cache_caption = None
+        if response.get('cache_hit'):
+            cache_stats = get_semantic_cache().stats()
+            st.session_state.cache_caption = (f"⚡ Answered from cache (similarity {response['similarity']:.2f}) · "
+                                              f"hit rate {cache_stats['hit_rate']:.0%} · {cache_stats['saved_seconds']:.1f}s saved")
+
+        sql_query = (st.session_state.response or {}).get('sql_query')
         if sql_query:
-            st.subheader("SQL Query")
-            st.code(sql_query, language="sql", wrap_lines=True)
-
-                # Display retrieved documents (if available)
-            if 'retrieved_docs' in st.session_state and st.session_state.retrieved_docs:
-                with st.expander("📚 Retrieved Context", expanded=False):
-                    # Separate documents by type
-                    sample_queries = [doc for doc in st.session_state.retrieved_docs if doc.get('metadata', {}).get('type') == 'sample-queries']
-                    table_info = [doc for doc in st.session_state.retrieved_docs if doc.get('metadata', {}).get('type') == 'tables-info']
-                    
-                    # Create tabs if we have both types
-                    if sample_queries and table_info:
-                        tab1, tab2 = st.tabs([f"📝 Sample Queries ({len(sample_queries)})", f"📊 Table Info ({len(table_info)})"])
-                        
-                        with tab1:
-                            for idx, doc in enumerate(sample_queries, 1):
-                                with st.container():
-                                    st.markdown(f"**{idx}. {doc['page_content']}**")
-                                    if 'sql' in doc.get('metadata', {}):
-                                        st.code(doc['metadata']['sql'], language="sql")
-                                    st.divider()
-                        
-                        with tab2:
-                            for idx, doc in enumerate(table_info, 1):
-                                table_name = doc.get('metadata', {}).get('table_name', f'Document {idx}')
-                                with st.expander(f"📋 {table_name}"):
-                                    st.markdown(doc['page_content'].replace('\\n','\n'), unsafe_allow_html=True)
-                    
-                    # If only one type exists
-                    elif sample_queries:
-                        for idx, doc in enumerate(sample_queries, 1):
-                            with st.container():
-                                st.markdown(f"**{idx}. {doc['page_content']}**")
-                                if 'sql' in doc.get('metadata', {}):
-                                    st.code(doc['metadata']['sql'], language="sql")
-                                st.divider()
-                    
-                    elif table_info:
-                        for idx, doc in enumerate(table_info, 1):
-                            table_name = doc.get('metadata', {}).get('table_name', f'Document {idx}')
-                            with st.expander(f"📋 {table_name}"):
-                                st.markdown(doc['page_content'])
-            
-            with st.spinner("Running query..."):
-                # import pandas as pd
-                # df = pd.DataFrame({
-                #     'emp_no': [10001, 10002],
-                #     'first_name': ['Alice', 'Betty'],
-                #     'last_name': ['Baaz', 'Baaz']
-                # })
-     
-                
-                df = run_query_df(sql_query)
-                st.session_state.df_result = df
-            
-            if st.session_state.df_result is not None and not st.session_state.df_result.empty:
-                st.subheader("Results")
-                st.dataframe(st.session_state.df_result, width='stretch')
-            elif st.session_state.df_result is not None:
-                st.info("Query executed successfully but returned no results.")
\ No newline at end of file
+            # Cache hits skip the agent's guard; the data may have grown since, so check again.
+            guard = response.get('guard')
+            if guard is None and QUERY_GUARD_ENABLED:
+                guard = guard_query(sql_query, database).to_dict()
+            st.session_state.guard = guard
+
+            if not guard or guard['verdict'] != 'reject':
+                # Only the visible page is fetched; later pages are fetched on demand
+                st.session_state.pager = QueryPager(guard['sql'] if guard else sql_query, database)
+                st.session_state.page = run_cancellable("Running query...", lambda: st.session_state.pager.page(0))
+                if st.session_state.page is not None:
+                    st.session_state.df_result = st.session_state.page.df
+
+# Display the latest answer, also on the reruns triggered by the paging and export buttons
+if st.session_state.get('cache_caption'):
+    st.caption(st.session_state.cache_caption)
+
+# Display explanation
+if st.session_state.response:
+    st.write(st.session_state.response.get('explanation', 'No explanation provided'))
+
+    # Display SQL query if not null
+    sql_query = st.session_state.response.get('sql_query')
+    if sql_query:
+        st.subheader("SQL Query")
+        st.code(sql_query, language="sql", wrap_lines=True)
+
+        # Display retrieved documents (if available)
+        if 'retrieved_docs' in st.session_state and st.session_state.retrieved_docs:
+            render_retrieved_docs(st.session_state.retrieved_docs)
+
+        guard = st.session_state.get('guard')
+        if guard and guard['verdict'] == 'reject' and guard['rows_examined'] is None:
+            st.error(f"🛑 Query not run: {guard['reason']}.")
+        elif guard and guard['verdict'] == 'reject':
+            st.error(f"🛑 Query not run: estimated plan is too expensive ({guard['reason']}). "
+                     "Try a more specific question.")
+        elif guard and guard['verdict'] == 'limit':
+            st.warning(f"⚠️ Expensive plan ({guard['reason']}).")
+        elif guard and guard['verdict'] == 'warn':
+            st.warning(f"⚠️ This query may be slow ({guard['reason']}).")
+        elif guard and guard['rows_examined'] is not None:
+            st.caption(f"Estimated plan: {guard['reason']}")
+
+        if st.session_state.get('query_error'):
+            st.warning(f"⏹️ {st.session_state.query_error}")
+
+        page = st.session_state.get('page')
+        if page is not None and not page.df.empty:
+            pager = st.session_state.pager
+            st.subheader("Results")
+            st.dataframe(dataframe_to_table(page.df), width='stretch')
+            st.caption(f"Rows {page.first_row + 1:,}–{page.first_row + len(page.df):,}"
+                       + ("" if page.has_next else " · end of result"))
+
+            prev_col, next_col = st.columns(2)
+            move = None
+            if prev_col.button("Previous page", disabled=page.number == 0, width='stretch'):
+                move = -1
+            if next_col.button("Next page", disabled=not page.has_next, width='stretch'):
+                move = 1
+            if move:
+                st.session_state.query_error = None
+                fetched = run_cancellable("Fetching page...", lambda: pager.page(page.number + move))
+                if fetched is not None:
+                    st.session_state.page = fetched
+                st.rerun()
+
+            # The full result is only read when it is exported
+            if st.button(f"Export full result ({export_format.upper()})"):
+                st.session_state.query_error = None
+                if st.session_state.get('export_path'):
+                    st.session_state.export_path.unlink(missing_ok=True)
+                    st.session_state.export_path = None
+                export_path = new_export_path(export_format)
+                row_counter = st.empty()
+
+                def export():
+                    # Server-side cursor: only one chunk of the result is held in memory at a time
+                    with ChunkWriter(export_path, export_format) as writer:
+                        for chunk in stream_query_df(pager.plan.sql, database, timeout=QUERY_EXPORT_TIMEOUT_SECONDS):
+                            writer.write(chunk)
+                            row_counter.caption(f"Rows exported: {writer.rows:,}")
+                    return writer.rows
+
+                rows = run_cancellable("Exporting...", export)
+                if rows is None:
+                    export_path.unlink(missing_ok=True)
+                    st.rerun()
+                st.session_state.export_path = export_path
+                st.session_state.row_count = rows
+
+            export_path = st.session_state.get('export_path')
+            if export_path and not export_path.exists():
+                # Deleted by the export cleanup of a later export
+                st.session_state.export_path = export_path = None
+            if export_path:
+                st.caption(f"Rows exported: {st.session_state.row_count:,}")
+                fmt = export_path.suffix.lstrip(".")
+                size = export_path.stat().st_size
+                if size <= EXPORT_DOWNLOAD_MAX_BYTES:
+                    with open(export_path, "rb") as f:
+                        st.download_button(
+                            f"Download {fmt.upper()}",
+                            data=f,
+                            file_name=f"query_result.{fmt}",
+                            mime="text/csv" if fmt == "csv" else "application/vnd.apache.parquet",
+                        )
+                else:
+                    # The download button holds the whole file in server memory
+                    st.info(f"The export ({size / 2**20:,.0f} MB) is too large to download here. "
+                            f"It is saved on the server at `{export_path.resolve()}`.")
+        elif page is not None:
+            st.info("Query executed successfully but returned no results.")